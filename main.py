@@ -18,12 +18,22 @@ def main():
         help='Executa a sincronização apenas uma vez e encerra'
     )
     
+    parser.add_argument(
+        '--dry-run',
+        action='store_true',
+        help='Monta o plano de sincronização, com as estimativas de chamadas e bytes, e o exibe sem fazer alterações'
+    )
+    
     args = parser.parse_args()
     
     try:
         synchronizer = CalendarSynchronizer()
         
-        if args.once:
+        if args.dry_run:
+            logger.info("Executando simulação da sincronização")
+            plan = synchronizer.synchronize(dry_run=True)
+            print(plan.to_json())
+        elif args.once:
             logger.info("Executando sincronização única")
             synchronizer.synchronize()
         else:
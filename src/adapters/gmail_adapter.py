@@ -1,50 +1,114 @@
-import os 
 import datetime
-from typing import List, Optional
+import json
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
 import pytz # pytz é uma biblioteca que fornece suporte para fusos horários.
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
 from googleapiclient.discovery import build
 from ..core.calendar_event import CalendarEvent
+from ..core.credential_manager import credential_manager
+from ..core.detail_cache import EventDetails, EventDetailsCache
+from ..core.merge_diff import event_sort_key
+from ..core.people import (RESPONSE_ACCEPTED, RESPONSE_DECLINED, RESPONSE_NEEDS_ACTION,
+                           RESPONSE_TENTATIVE, people)
+from ..core.sync_planner import GMAIL_WRITE_BATCH_SIZE
 from ..config.settings import config
 from ..utils.logger import logger
+from ..utils.token_store import FileLock, atomic_write, read_text
+
+# Projeção leve usada na listagem: apenas identificação, versão, datas e campos baratos.
+LIST_FIELDS = 'nextPageToken,items(id,etag,status,summary,location,start,end,recurrence,created,updated)'
+# Campos pesados buscados sob demanda, apenas para eventos alterados.
+DETAIL_FIELDS = 'id,etag,description,attendees,organizer'
+# Quantidade máxima de requisições por lote (recomendação da API do Google).
+DETAIL_BATCH_SIZE = 50
+# Quantidade de eventos por página na listagem.
+PAGE_SIZE = 250
+# Conversão entre o responseStatus do Google e o vocabulário comum de status de resposta.
+RESPONSE_STATUS_FROM_GOOGLE = {
+    'accepted': RESPONSE_ACCEPTED,
+    'declined': RESPONSE_DECLINED,
+    'tentative': RESPONSE_TENTATIVE,
+    'needsAction': RESPONSE_NEEDS_ACTION,
+}
+RESPONSE_STATUS_TO_GOOGLE = {status: google for google, status in RESPONSE_STATUS_FROM_GOOGLE.items()}
 
 class GmailAdapter:
     """Adaptador para interagir com a API do Google Calendar."""
 
-    def __init__(self):
+    def __init__(self, on_api_calls: Optional[Callable[[int], None]] = None):
         self.creds = None
         self.service = None
         self.calendar_id = config.gmail.calendar_id
+        self.details_cache = EventDetailsCache(config.sync.detail_cache_size)
+        # Chamado com a quantidade de chamadas de leitura feitas, para o controle de cota
+        self.on_api_calls = on_api_calls
+        self.token_lock = FileLock(config.gmail.token_file)
         self.authenticate()
 
     def authenticate(self):
         """Autentica o usuário e obtém as credenciais do Google Calendar."""
         scopes = config.gmail.scopes
-        creds = None
 
-        if os.path.exists(config.gmail.token_file):
-            creds = Credentials.from_authorized_user_info(
-                eval(open(config.gmail.token_file, "r").read()),
-                scopes
-            )
+        with self.token_lock:
+            creds = self._load_stored_credentials()
 
-        if not creds or not creds.valid:
-            if creds and creds.expired and creds.refresh_token:
+            if creds and not creds.valid and creds.expired and creds.refresh_token:
                 creds.refresh(Request())
-            else:
-                flow = InstalledAppFlow.from_client_secrets_file(
-                    config.gmail.credentials_file, scopes)
-                creds = flow.run_local_server(port=0)
-            with open(config.gmail.token_file, 'w') as token:
-                token.write(str(creds.to_json()))
+                atomic_write(config.gmail.token_file, creds.to_json())
+
+        if not creds or not creds.valid:
+            # O fluxo interativo roda sem o bloqueio, para não travar os outros processos
+            flow = InstalledAppFlow.from_client_secrets_file(
+                config.gmail.credentials_file, scopes)
+            creds = flow.run_local_server(port=0)
+            with self.token_lock:
+                atomic_write(config.gmail.token_file, creds.to_json())
 
         self.creds = creds
         self.service = build('calendar', 'v3', credentials=creds)
         logger.info("Autenticação bem-sucedida com o Google Calendar.")
 
-def _convert_to_calendar_event(self, event) -> CalendarEvent:
+        # Registra o token para renovação em segundo plano
+        credential_manager.register('Gmail', self.token_expires_at, self.refresh_token)
+
+    def _load_stored_credentials(self) -> Optional[Credentials]:
+        """Lê as credenciais salvas no arquivo de token, se existirem."""
+        content = read_text(config.gmail.token_file)
+        if not content:
+            return None
+        return Credentials.from_authorized_user_info(json.loads(content), config.gmail.scopes)
+
+    def token_expires_at(self) -> Optional[datetime.datetime]:
+        """Retorna a expiração (UTC) do token de acesso em memória."""
+        if not self.creds or not self.creds.expiry:
+            return None
+        # O google-auth armazena a expiração como UTC sem fuso
+        return pytz.UTC.localize(self.creds.expiry)
+
+    def refresh_token(self):
+        """
+        Renova o token do Gmail sob o bloqueio do arquivo de token.
+
+        Se outro processo já tiver renovado o token, ele é apenas adotado; as
+        credenciais são atualizadas no mesmo objeto usado pelo serviço.
+        """
+        with self.token_lock:
+            stored = self._load_stored_credentials()
+            now = datetime.datetime.utcnow()
+            if (stored and stored.token and stored.expiry
+                    and stored.expiry - credential_manager.refresh_margin > now):
+                self.creds.token = stored.token
+                self.creds.expiry = stored.expiry
+                logger.info("Token do Gmail já renovado por outro processo")
+                return
+
+            self.creds.refresh(Request())
+            atomic_write(config.gmail.token_file, self.creds.to_json())
+            logger.info("Token do Gmail renovado com sucesso")
+
+    def _convert_to_calendar_event(self, event) -> CalendarEvent:
         """Converte um evento do Google Calendar para o modelo CalendarEvent."""
         # Determina se é um evento de dia inteiro
         is_all_day = 'date' in event['start'] and 'date' in event['end']
@@ -58,47 +122,97 @@ def _convert_to_calendar_event(self, event) -> CalendarEvent:
             end_time = datetime.datetime.fromisoformat(event['end'].get('dateTime', ''))
 
 
-        attendees = None
-        if 'attendees' in event:
-            attendees = [
-                {'email': attendee.get('email', ''), 
-                'name': attendee.get('displayName', ''),
-                'response_status': attendee.get('responseStatus', '')}
-                for attendee in event['attendees']
-            ]
-        
         # Criando um objeto CalendarEvent
         return CalendarEvent(
             id=event['id'],
             summary=event.get('summary', 'Sem título'),
-            description=event.get('description', None),
             location=event.get('location', None),
             start_time=start_time,
             end_time=end_time,
             is_all_day=is_all_day,
             recurrence=event.get('recurrence', None),
-            attendees=attendees,
-            organizer=organizer,
             status=event.get('status', 'confirmed'),
             created=datetime.datetime.fromisoformat(event.get('created', datetime.datetime.now().isoformat())),
             updated=datetime.datetime.fromisoformat(event.get('updated', datetime.datetime.now().isoformat())),
             source='gmail',
-            source_id=event['id']
+            source_id=event['id'],
+            version=event.get('etag')
         )
 
-        def _convert_from_calendar_event(self, event: CalendarEvent) -> dict:
-            """Converte um CalendarEvent para o formato do Google Calendar."""
+    def _extract_details(self, event) -> EventDetails:
+        """Extrai os campos pesados (descrição, participantes e organizador) de um evento."""
+        # Processa participantes (referências para a tabela compartilhada de pessoas)
+        attendee_ids = None
+        attendee_responses = None
+        if 'attendees' in event:
+            attendee_ids, attendee_responses = people.intern_attendees(
+                (attendee.get('email', ''),
+                 attendee.get('displayName', ''),
+                 RESPONSE_STATUS_FROM_GOOGLE.get(attendee.get('responseStatus'), RESPONSE_NEEDS_ACTION))
+                for attendee in event['attendees']
+            )
+
+        # Processa organizador
+        organizer_id = None
+        if 'organizer' in event:
+            organizer_id = people.intern(
+                event['organizer'].get('email', ''),
+                event['organizer'].get('displayName', '')
+            )
+
+        return EventDetails(
+            version=event.get('etag'),
+            description=event.get('description', None),
+            attendee_ids=attendee_ids,
+            attendee_responses=attendee_responses,
+            organizer_id=organizer_id
+        )
+
+    def _charge(self, calls: int):
+        """Informa as chamadas de leitura feitas ao controle de cota, se houver."""
+        if self.on_api_calls:
+            self.on_api_calls(calls)
+
+    def _fetch_details(self, event_ids: List[str]) -> Dict[str, EventDetails]:
+        """Busca em lote os campos pesados dos eventos informados."""
+        details = {}
+
+        def _on_response(request_id, response, exception):
+            if exception is not None:
+                logger.error(f"Erro ao buscar detalhes do evento {request_id} no Gmail: {exception}")
+                return
+            details[request_id] = self._extract_details(response)
+
+        for i in range(0, len(event_ids), DETAIL_BATCH_SIZE):
+            batch = self.service.new_batch_http_request(callback=_on_response)
+            for event_id in event_ids[i:i + DETAIL_BATCH_SIZE]:
+                batch.add(
+                    self.service.events().get(
+                        calendarId=self.calendar_id,
+                        eventId=event_id,
+                        fields=DETAIL_FIELDS
+                    ),
+                    request_id=event_id
+                )
+            batch.execute()
+            # Cada requisição do lote conta como uma chamada na cota
+            self._charge(len(event_ids[i:i + DETAIL_BATCH_SIZE]))
+
+        return details
+
+    def _convert_from_calendar_event(self, event: CalendarEvent) -> dict:
+        """Converte um CalendarEvent para o formato do Google Calendar."""
         google_event = {
             'summary': event.summary,
             'status': event.status
         }
-        
+
         if event.description:
             google_event['description'] = event.description
-        
+
         if event.location:
             google_event['location'] = event.location
-        
+
         # Define datas
         if event.is_all_day:
             start_date = event.start_time.date().isoformat()
@@ -110,96 +224,205 @@ def _convert_to_calendar_event(self, event) -> CalendarEvent:
             end_datetime = event.end_time.isoformat()
             google_event['start'] = {'dateTime': start_datetime, 'timeZone': 'UTC'}
             google_event['end'] = {'dateTime': end_datetime, 'timeZone': 'UTC'}
-        
+
         # Adiciona recorrência se existir
         if event.recurrence:
             google_event['recurrence'] = event.recurrence
-        
+
         # Adiciona participantes se existirem
         if event.attendees:
             google_event['attendees'] = [
                 {
                     'email': attendee.get('email', ''),
                     'displayName': attendee.get('name', ''),
-                    'responseStatus': attendee.get('response_status', 'needsAction')
+                    'responseStatus': RESPONSE_STATUS_TO_GOOGLE.get(attendee.get('response_status'), 'needsAction')
                 }
                 for attendee in event.attendees
             ]
-        
+
         return google_event
 
-        def get_events(self, time_min: Optional[datetime.datetime] = None, 
-                time_max: Optional[datetime.datetime] = None) -> List[CalendarEvent]:
-            """Obtém eventos do Google Calendar."""
+    def _load_details(self, calendar_events: List[CalendarEvent],
+                      incomplete_starts: Optional[Set[datetime.datetime]] = None) -> List[CalendarEvent]:
+        """
+        Preenche os campos pesados, buscando apenas os eventos cuja versão mudou.
+
+        Eventos cujos detalhes não puderam ser carregados são descartados desta
+        passagem: sem eles a impressão digital mudaria e o evento seria duplicado.
+        Os inícios dos eventos descartados são acrescentados a `incomplete_starts`.
+        """
+        stale_events = []
+        for calendar_event in calendar_events:
+            details = self.details_cache.get(calendar_event.source_id, calendar_event.version)
+            if details:
+                details.apply_to(calendar_event)
+            else:
+                stale_events.append(calendar_event)
+
+        if stale_events:
+            logger.debug(f"Buscando detalhes de {len(stale_events)} eventos alterados no Gmail")
+            fetched = self._fetch_details([event.source_id for event in stale_events])
+            missing = set()
+            for calendar_event in stale_events:
+                details = fetched.get(calendar_event.source_id)
+                if details:
+                    self.details_cache.put(calendar_event.source_id, details)
+                    details.apply_to(calendar_event)
+                else:
+                    missing.add(calendar_event.source_id)
+
+            if missing:
+                logger.warning(f"Ignorando nesta passagem {len(missing)} eventos do Gmail sem detalhes carregados")
+                if incomplete_starts is not None:
+                    incomplete_starts.update(
+                        event_sort_key(event) for event in stale_events if event.source_id in missing)
+                return [event for event in calendar_events if event.source_id not in missing]
+
+        return calendar_events
+
+    def iter_events(self, time_min: Optional[datetime.datetime] = None,
+                    time_max: Optional[datetime.datetime] = None,
+                    incomplete_starts: Optional[Set[datetime.datetime]] = None) -> Iterator[CalendarEvent]:
+        """
+        Percorre os eventos do Google Calendar em ordem de início, página por página.
+
+        Os inícios dos eventos descartados por falta de detalhes são acrescentados
+        a `incomplete_starts`, que pertence a esta listagem.
+        """
         if not time_min:
             time_min = datetime.datetime.now(pytz.UTC) - datetime.timedelta(days=30)
         if not time_max:
             time_max = datetime.datetime.now(pytz.UTC) + datetime.timedelta(days=90)
-        
+
         # Formata as datas para o formato ISO
         time_min_str = time_min.isoformat()
         time_max_str = time_max.isoformat()
-        
+
         logger.info(f"Buscando eventos do Gmail entre {time_min_str} e {time_max_str}")
-        
-        events_result = self.service.events().list(
-            calendarId=self.calendar_id,
-            timeMin=time_min_str,
-            timeMax=time_max_str,
-            singleEvents=True,
-            orderBy='startTime'
-        ).execute()
-        
-        events = events_result.get('items', [])
-        calendar_events = [self._convert_to_calendar_event(event) for event in events]
-        
-        logger.info(f"Encontrados {len(calendar_events)} eventos no Gmail")
-        return calendar_events
 
-        def create_event(self, event: CalendarEvent) -> CalendarEvent:
-            """Cria um novo evento no Google Calendar."""
-            google_event = self._convert_from_calendar_event(event)
-            
-            logger.info(f"Criando evento no Gmail: {event.summary}")
-            
-            created_event = self.service.events().insert(
+        total = 0
+        page_token = None
+        while True:
+            events_result = self.service.events().list(
                 calendarId=self.calendar_id,
-                body=google_event
+                timeMin=time_min_str,
+                timeMax=time_max_str,
+                singleEvents=True,
+                orderBy='startTime',
+                maxResults=PAGE_SIZE,
+                pageToken=page_token,
+                fields=LIST_FIELDS
             ).execute()
-            
-            # Atualiza o ID do evento com o ID retornado pelo Google
-            event.id = created_event['id']
-            event.source_id = created_event['id']
-            
-            logger.info(f"Evento criado com sucesso no Gmail: {event.id}")
+            self._charge(1)
+
+            events = events_result.get('items', [])
+            calendar_events = [self._convert_to_calendar_event(event) for event in events]
+            calendar_events = self._load_details(calendar_events, incomplete_starts)
+
+            total += len(calendar_events)
+            yield from calendar_events
+
+            page_token = events_result.get('nextPageToken')
+            if not page_token:
+                break
+
+        logger.info(f"Encontrados {total} eventos no Gmail")
+
+    def get_events(self, time_min: Optional[datetime.datetime] = None, 
+                time_max: Optional[datetime.datetime] = None) -> List[CalendarEvent]:
+        """Obtém eventos do Google Calendar."""
+        return list(self.iter_events(time_min, time_max))
+
+    def create_event(self, event: CalendarEvent) -> CalendarEvent:
+        """Cria um novo evento no Google Calendar."""
+        google_event = self._convert_from_calendar_event(event)
+
+        logger.info(f"Criando evento no Gmail: {event.summary}")
+
+        created_event = self.service.events().insert(
+            calendarId=self.calendar_id,
+            body=google_event
+        ).execute()
+
+        # Atualiza o ID do evento com o ID retornado pelo Google
+        event.id = created_event['id']
+        event.source_id = created_event['id']
+
+        logger.info(f"Evento criado com sucesso no Gmail: {event.id}")
+        return event
+
+    def update_event(self, event: CalendarEvent) -> CalendarEvent:
+        """Atualiza um evento existente no Google Calendar."""
+        google_event = self._convert_from_calendar_event(event)
+
+        logger.info(f"Atualizando evento no Gmail: {event.summary} (ID: {event.source_id})")
+
+        update_event = self.service.events().update(
+            calendarId=self.calendar_id,
+            eventId=event.source_id,
+            body=google_event
+        ).execute()
+
+        logger.info(f"Evento atualizado com sucesso no Gmail: {event.source_id}")
         return event
 
-        def update_event(self, event: CalendarEvent) -> CalendarEvent:
-            """Atualiza um evento existente no Google Calendar."""
-            google_event = self._convert_from_calendar_event(event)
+    def write_events(self, writes: List[Tuple[str, CalendarEvent]]) -> List[Optional[CalendarEvent]]:
+        """
+        Cria ou atualiza eventos no Google Calendar em requisições em lote de até
+        `GMAIL_WRITE_BATCH_SIZE` escritas.
+
+        Recebe pares (ação, evento), com ação 'create' ou 'update', e retorna o
+        evento escrito na mesma posição, ou None se a escrita falhou.
+        """
+        results: List[Optional[CalendarEvent]] = [None] * len(writes)
+
+        def _on_response(request_id, response, exception):
+            index = int(request_id)
+            action, event = writes[index]
+            if exception is not None:
+                verb = 'criar' if action == 'create' else 'atualizar'
+                logger.error(f"Erro ao {verb} evento no Gmail: {exception}")
+                return
+            if action == 'create':
+                # Atualiza o ID do evento com o ID retornado pelo Google
+                event.id = response['id']
+                event.source_id = response['id']
+            results[index] = event
+
+        for i in range(0, len(writes), GMAIL_WRITE_BATCH_SIZE):
+            chunk = writes[i:i + GMAIL_WRITE_BATCH_SIZE]
+            logger.info(f"Enviando lote de {len(chunk)} escritas para o Gmail")
+            batch = self.service.new_batch_http_request(callback=_on_response)
+            for index, (action, event) in enumerate(chunk, start=i):
+                google_event = self._convert_from_calendar_event(event)
+                if action == 'create':
+                    request = self.service.events().insert(
+                        calendarId=self.calendar_id,
+                        body=google_event
+                    )
+                else:
+                    request = self.service.events().update(
+                        calendarId=self.calendar_id,
+                        eventId=event.source_id,
+                        body=google_event
+                    )
+                batch.add(request, request_id=str(index))
+            batch.execute()
+
+        return results
 
-            logger.info(f"Atualizando evento no Gmail: {event.summary} (ID: {event.source_id})")
+    def delete_event(self, event_id: str) -> bool:
+        """Deleta um evento do Google Calendar."""
+        logger.info(f"Deletando evento no Gmail: {event_id}")
 
-            update_event = self.service.events().update(
+        try: 
+            self.service.events().delete(
                 calendarId=self.calendar_id,
-                eventId=event.source_id,
-                body=google_event
+                eventId=event_id
             ).execute()
+            logger.info(f"Evento deletado com sucesso no Gmail: {event_id}")
+            return True
+        except Exception as e:
+            logger.error(f"Erro ao deletar evento no Gmail: {e}")
+            return False
 
-            logger.info(f"Evento atualizado com sucesso no Gmail: {event.source_id}")
-            return event
-        
-        def delete_event(self, event_id: str) -> bool:
-            """Deleta um evento do Google Calendar."""
-            logger.info(f"Deletando evento no Gmail: {event_id}")
-
-            try: 
-                self.service.events().delete(
-                    calendarId=self.calendar_id,
-                    eventId=event_id
-                ).execute()
-                logger.info(f"Evento deletado com sucesso no Gmail: {event_id}")
-                return True
-            except Exception as e:
-                logger.error(f"Erro ao deletar evento no Gmail: {e}")
-                return False
@@ -0,0 +1,77 @@
+import datetime # datetime é utilizado para manipular datas e horas.
+import json # json é utilizado para serializar o token.
+from typing import Optional # Optional é utilizado para definir tipos de retorno.
+import pytz # pytz é utilizado para manipular fusos horários.
+from O365.utils import BaseTokenBackend # BaseTokenBackend é a interface de armazenamento de tokens do O365.
+from ..utils.token_store import FileLock, atomic_write, read_text # utilitários de bloqueio e escrita atômica.
+
+
+class LockedFileTokenBackend(BaseTokenBackend):
+    """
+    Armazena o token do O365 em arquivo, com escrita atômica e bloqueio entre processos.
+
+    O token fica em memória; o arquivo só é lido ao iniciar ou quando outro
+    processo pode tê-lo renovado.
+    """
+
+    def __init__(self, token_file: str):
+        super().__init__()
+        self.token_file = token_file
+        self.lock = FileLock(token_file)
+
+    def __repr__(self):
+        return self.token_file
+
+    def load_token(self):
+        """Lê o token do arquivo, retornando None se ele não existir."""
+        with self.lock:
+            content = read_text(self.token_file)
+        if not content:
+            return None
+        return self.token_constructor(self.serializer.loads(content))
+
+    def save_token(self):
+        """Grava o token atual no arquivo de forma atômica."""
+        if self.token is None:
+            raise ValueError('You have to set the "token" first.')
+        with self.lock:
+            atomic_write(self.token_file, json.dumps(self.token, indent=True))
+        return True
+
+    def delete_token(self):
+        """Remove o arquivo do token."""
+        with self.lock:
+            if read_text(self.token_file) is None:
+                return False
+            atomic_write(self.token_file, '')
+        return True
+
+    def check_token(self):
+        """Verifica se existe um token armazenado."""
+        return bool(read_text(self.token_file))
+
+    def access_expires_at(self, token=None) -> Optional[datetime.datetime]:
+        """Retorna a expiração do token de acesso em UTC."""
+        token = token if token is not None else self.token
+        if not token or not token.get('expires_at'):
+            return None
+        return datetime.datetime.fromtimestamp(token['expires_at'], pytz.UTC)
+
+    def should_refresh_token(self, con=None):
+        """
+        Renova o token sob o bloqueio do arquivo.
+
+        Se outro processo já tiver renovado o token, ele é apenas adotado.
+        Retorna None, indicando à conexão que a renovação já foi tratada.
+        """
+        with self.lock:
+            stored = self.load_token()
+            expires_at = self.access_expires_at(stored)
+            if expires_at and expires_at > datetime.datetime.now(pytz.UTC):
+                self.token = stored
+                if con is not None and con.session is not None:
+                    con.session.token = stored
+                return None
+            if con is not None and con.refresh_token() is False:
+                raise RuntimeError('Token Refresh Operation not working')
+        return None
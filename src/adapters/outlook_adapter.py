@@ -1,21 +1,50 @@
 import os # os é utilizado para manipular o sistema operacional.
 import json # json é utilizado para manipular arquivos JSON.
 import datetime # datetime é utilizado para manipular datas e horas.
-from typing import List, Optional # List e Optional são utilizados para definir tipos de retorno.
+import itertools # itertools é utilizado para dividir a listagem em páginas.
+from typing import Callable, Dict, Iterator, List, Optional, Set # Callable, Dict, Iterator, List, Optional e Set são utilizados para definir tipos de retorno.
 import pytz # pytz é utilizado para manipular fusos horários.
-from O365 import Account, FileSystemTokenBackend # Account e FileSystemTokenBackend são utilizados para autenticar no Microsoft 365.
+from O365 import Account # Account é utilizado para autenticar no Microsoft 365.
 from O365.calendar import Event as O365Event # 0365Event é utilizado para manipular eventos no Microsoft 365.
+from .o365_token_backend import LockedFileTokenBackend # LockedFileTokenBackend guarda o token com escrita atômica e bloqueio entre processos.
 from ..core.calendar_event import CalendarEvent # CalendarEvent é utilizado para manipular eventos no calendário.
+from ..core.credential_manager import credential_manager # credential_manager renova o token em segundo plano.
+from ..core.detail_cache import EventDetails, EventDetailsCache # EventDetails guarda os campos pesados carregados sob demanda.
+from ..core.merge_diff import event_sort_key # event_sort_key normaliza o início dos eventos.
+from ..core.people import (RESPONSE_ACCEPTED, RESPONSE_DECLINED, RESPONSE_NEEDS_ACTION,
+                           RESPONSE_TENTATIVE, people) # people é a tabela compartilhada de participantes e organizadores.
 from ..config.settings import config # config é utilizado para acessar as configurações do sistema. 
 from ..utils.logger import logger # ..utils.logger é utilizado para acessar o logger do sistema.
 
+# Projeção leve usada na listagem: apenas identificação, versão, datas e campos baratos.
+LIST_FIELDS = ('id', 'subject', 'start', 'end', 'is_all_day', 'is_cancelled', 'location',
+               'recurrence', 'created_date_time', 'last_modified_date_time')
+# Campos pesados buscados sob demanda, apenas para eventos alterados.
+DETAIL_FIELDS = ('id', 'body', 'attendees', 'organizer', 'last_modified_date_time')
+# Quantidade máxima de requisições por lote (limite do JSON batching do Microsoft Graph).
+DETAIL_BATCH_SIZE = 20
+# Quantidade de eventos processados por página na listagem.
+PAGE_SIZE = 250
+# Conversão dos valores do enum ResponseType do O365 para o vocabulário comum de status de resposta.
+RESPONSE_STATUS_FROM_OUTLOOK = {
+    'organizer': RESPONSE_ACCEPTED,
+    'accepted': RESPONSE_ACCEPTED,
+    'declined': RESPONSE_DECLINED,
+    'tentatively_accepted': RESPONSE_TENTATIVE,
+    'not_responded': RESPONSE_NEEDS_ACTION,
+    'none': RESPONSE_NEEDS_ACTION,
+}
+
 class OutlookAdapter:
     """Adaptador para interagir com a API do Outlook Calendar."""
 
-    def __init__(self):
+    def __init__(self, on_api_calls: Optional[Callable[[int], None]] = None):
         """Inicializa o adaptador."""
         self.account = None
         self.calendar = None
+        self.details_cache = EventDetailsCache(config.sync.detail_cache_size)
+        # Chamado com a quantidade de chamadas de leitura feitas, para o controle de cota
+        self.on_api_calls = on_api_calls
         self.authenticate()
 
     def authenticate(self):
@@ -24,7 +53,7 @@ class OutlookAdapter:
         client_secret = config.outlook.client_secret
 
         # configurando o backend do token
-        token_backend = FileSystemTokenBackend(token_path='.', token_filename='o365_token.txt')
+        token_backend = LockedFileTokenBackend(config.outlook.token_file)
 
         # Cria a conta
         self.account = Account((client_id, client_secret), token_backend=token_backend)
@@ -39,6 +68,9 @@ class OutlookAdapter:
                 logger.error("Falha na autenticação na API do Outlook Calendar")
                 raise Exception("Falha na autenticação com a API do Outlook Calendar")
 
+        # Registra o token para renovação em segundo plano
+        credential_manager.register('Outlook', self.token_expires_at, self.refresh_token)
+
         # Obtendo o calendário
         schedule = self.account.schedule()
         calendar_id = config.outlook.calendar_id
@@ -50,6 +82,33 @@ class OutlookAdapter:
         
             logger.info(f"Usando calendário: {self.calendar.name}")
     
+    def token_expires_at(self) -> Optional[datetime.datetime]:
+        """Retorna a expiração (UTC) do token de acesso em memória."""
+        return self.account.connection.token_backend.access_expires_at()
+
+    def refresh_token(self):
+        """
+        Renova o token do Outlook sob o bloqueio do arquivo de token.
+
+        Se outro processo já tiver renovado o token, ele é apenas adotado.
+        """
+        connection = self.account.connection
+        token_backend = connection.token_backend
+        with token_backend.lock:
+            stored = token_backend.load_token()
+            expires_at = token_backend.access_expires_at(stored)
+            now = datetime.datetime.now(pytz.UTC)
+            if expires_at and expires_at - credential_manager.refresh_margin > now:
+                token_backend.token = stored
+                if connection.session is not None:
+                    connection.session.token = stored
+                logger.info("Token do Outlook já renovado por outro processo")
+                return
+
+            if connection.refresh_token() is False:
+                raise Exception("Falha ao renovar o token do Outlook")
+            logger.info("Token do Outlook renovado com sucesso")
+    
     def _convert_to_calendar_event(self, event: O365Event) -> CalendarEvent:
         """Converte um evento do Outlook para o modelo CalendarEvent."""
 
@@ -60,24 +119,6 @@ class OutlookAdapter:
         start_time = event.start
         end_time = event.end
         
-        # Processa participantes
-        attendees = None
-        if event.attendees:
-            attendees = [
-                {'email': attendee.address, 
-                'name': attendee.name,
-                'response_status': attendee.response_status}
-                for attendee in event.attendees
-            ]
-        
-        # Processa organizador
-        organizer = None
-        if event.organizer:
-            organizer = {
-                'email': event.organizer.address,
-                'name': event.organizer.name
-            }
-        
         # Processa recorrência
         recurrence = None
         if event.recurrence:
@@ -87,21 +128,100 @@ class OutlookAdapter:
         return CalendarEvent(
             id=event.object_id,
             summary=event.subject,
-            description=event.body,
             location=event.location.get('displayName') if event.location else None,
             start_time=start_time,
             end_time=end_time,
             is_all_day=is_all_day,
             recurrence=recurrence,
-            attendees=attendees,
-            organizer=organizer,
             status='confirmed' if not event.is_cancelled else 'cancelled',
             created=event.created,
             updated=event.modified,
             source='outlook',
-            source_id=event.object_id
+            source_id=event.object_id,
+            version=event.modified.isoformat() if event.modified else None
         )
 
+    def _extract_details(self, event: O365Event) -> EventDetails:
+        """Extrai os campos pesados (corpo, participantes e organizador) de um evento."""
+        # Processa participantes
+        attendee_ids = None
+        attendee_responses = None
+        if event.attendees:
+            attendee_ids, attendee_responses = people.intern_attendees(
+                (attendee.address,
+                 attendee.name,
+                 self._response_status(attendee))
+                for attendee in event.attendees
+            )
+        
+        # Processa organizador
+        organizer_id = None
+        if event.organizer:
+            organizer_id = people.intern(event.organizer.address, event.organizer.name)
+        
+        return EventDetails(
+            version=event.modified.isoformat() if event.modified else None,
+            description=event.body,
+            attendee_ids=attendee_ids,
+            attendee_responses=attendee_responses,
+            organizer_id=organizer_id
+        )
+
+    @staticmethod
+    def _response_status(attendee) -> str:
+        """Converte o status de resposta do participante (um Enum no O365) para o vocabulário comum."""
+        status = getattr(attendee.response_status, 'status', None)
+        return RESPONSE_STATUS_FROM_OUTLOOK.get(status.value if status else None, RESPONSE_NEEDS_ACTION)
+
+    def _build_query(self, time_min: datetime.datetime, time_max: datetime.datetime, *fields):
+        """Monta a consulta do intervalo de datas, selecionando apenas os campos informados."""
+        q = self.calendar.new_query('start').greater_equal(time_min)
+        q.chain('and').on_attribute('end').less_equal(time_max)
+        return q.select(*fields)
+
+    def _charge(self, calls: int):
+        """Informa as chamadas de leitura feitas ao controle de cota, se houver."""
+        if self.on_api_calls:
+            self.on_api_calls(calls)
+
+    def _fetch_details(self, stale_events: List[CalendarEvent]) -> Dict[str, EventDetails]:
+        """Busca os campos pesados dos eventos informados via JSON batching do Microsoft Graph."""
+        details = {}
+        connection = self.account.connection
+        service_url = self.calendar.protocol.service_url
+        select = ','.join(self.calendar.protocol.convert_case(field) for field in DETAIL_FIELDS)
+
+        for i in range(0, len(stale_events), DETAIL_BATCH_SIZE):
+            chunk = stale_events[i:i + DETAIL_BATCH_SIZE]
+            requests = []
+            for index, event in enumerate(chunk):
+                url = self.calendar.build_url(f"/events/{event.source_id}")
+                requests.append({
+                    'id': str(index),
+                    'method': 'GET',
+                    # As URLs do lote são relativas à raiz do serviço
+                    'url': f"/{url[len(service_url):]}?$select={select}",
+                    'headers': {'Prefer': 'outlook.timezone="UTC"'}
+                })
+
+            response = connection.post(f"{service_url}$batch", data={'requests': requests})
+            # Cada requisição do lote conta como uma chamada nos limites do Graph
+            self._charge(len(requests))
+            if not response:
+                logger.error("Falha ao buscar detalhes de eventos no Outlook")
+                continue
+
+            for item in response.json().get('responses', []):
+                event_id = chunk[int(item['id'])].source_id
+                if item.get('status') != 200:
+                    logger.error(f"Erro ao buscar detalhes do evento {event_id} no Outlook: {item.get('status')}")
+                    continue
+                event = self.calendar.event_constructor(
+                    parent=self.calendar, **{self.calendar._cloud_data_key: item['body']})
+                details[event_id] = self._extract_details(event)
+
+        return details
+
     def _convert_from_calendar_event(self, event: CalendarEvent) -> O365Event:
         """Converte um CalendarEvent para o formato do Outlook Calendar."""
         outlook_event = self.calendar.new_event()
@@ -118,16 +238,62 @@ class OutlookAdapter:
         outlook_event.end = event.end_time
         outlook_event.is_all_day = event.is_all_day
         
-        # Adiciona participantes se existirem
+        # Adiciona participantes (reconstruídos a partir da tabela de pessoas) se existirem;
+        # o O365 recebe cada um como (email, nome), e participantes sem email não podem ser convidados
         if event.attendees:
             for attendee in event.attendees:
-                outlook_event.attendees.add(attendee.get('email'), attendee.get('name', ''))
+                if attendee['email']:
+                    outlook_event.attendees.add((attendee['email'], attendee['name']))
         
-    return outlook_event
+        return outlook_event
     
-    def get_events(self, time_min: Optional[datetime.datetime] = None, 
-                time_max: Optional[datetime.datetime] = None) -> List[CalendarEvent]:
-        """Obtém eventos do Outlook Calendar."""
+    def _load_details(self, calendar_events: List[CalendarEvent],
+                      incomplete_starts: Optional[Set[datetime.datetime]] = None) -> List[CalendarEvent]:
+        """
+        Preenche os campos pesados, buscando apenas os eventos cuja versão mudou.
+
+        Eventos cujos detalhes não puderam ser carregados são descartados desta
+        passagem: sem eles a impressão digital mudaria e o evento seria duplicado.
+        Os inícios dos eventos descartados são acrescentados a `incomplete_starts`.
+        """
+        stale_events = []
+        for calendar_event in calendar_events:
+            details = self.details_cache.get(calendar_event.source_id, calendar_event.version)
+            if details:
+                details.apply_to(calendar_event)
+            else:
+                stale_events.append(calendar_event)
+        
+        if stale_events:
+            logger.debug(f"Buscando detalhes de {len(stale_events)} eventos alterados no Outlook")
+            fetched = self._fetch_details(stale_events)
+            missing = set()
+            for calendar_event in stale_events:
+                details = fetched.get(calendar_event.source_id)
+                if details:
+                    self.details_cache.put(calendar_event.source_id, details)
+                    details.apply_to(calendar_event)
+                else:
+                    missing.add(calendar_event.source_id)
+
+            if missing:
+                logger.warning(f"Ignorando nesta passagem {len(missing)} eventos do Outlook sem detalhes carregados")
+                if incomplete_starts is not None:
+                    incomplete_starts.update(
+                        event_sort_key(event) for event in stale_events if event.source_id in missing)
+                return [event for event in calendar_events if event.source_id not in missing]
+
+        return calendar_events
+    
+    def iter_events(self, time_min: Optional[datetime.datetime] = None,
+                    time_max: Optional[datetime.datetime] = None,
+                    incomplete_starts: Optional[Set[datetime.datetime]] = None) -> Iterator[CalendarEvent]:
+        """
+        Percorre os eventos do Outlook Calendar em ordem de início, página por página.
+        
+        Os inícios dos eventos descartados por falta de detalhes são acrescentados
+        a `incomplete_starts`, que pertence a esta listagem.
+        """
         if not time_min:
             time_min = datetime.datetime.now(pytz.UTC) - datetime.timedelta(days=30)
         if not time_max:
@@ -135,32 +301,51 @@ class OutlookAdapter:
         
         logger.info(f"Buscando eventos do Outlook entre {time_min.isoformat()} e {time_max.isoformat()}")
         
-        # Consulta eventos no intervalo especificado
-        q = self.calendar.new_query('start').greater_equal(time_min)
-        q.chain('and').on_attribute('end').less_equal(time_max)
+        # Consulta eventos no intervalo especificado, apenas com a projeção leve
+        q = self._build_query(time_min, time_max, *LIST_FIELDS)
         
-        events = list(self.calendar.get_events(query=q, include_recurring=True))
-        calendar_events = [self._convert_to_calendar_event(event) for event in events]
+        # A listagem é paginada pelo servidor em PAGE_SIZE eventos por requisição
+        events = iter(self.calendar.get_events(limit=None, query=q, order_by='start/dateTime',
+                                               batch=PAGE_SIZE, include_recurring=True))
+        total = 0
+        self._charge(1)
+        while True:
+            page = list(itertools.islice(events, PAGE_SIZE))
+            if not page:
+                break
+            if len(page) == PAGE_SIZE:
+                # Uma página cheia indica que a próxima exige outra requisição
+                self._charge(1)
+            
+            calendar_events = [self._convert_to_calendar_event(event) for event in page]
+            calendar_events = self._load_details(calendar_events, incomplete_starts)
+            
+            total += len(calendar_events)
+            yield from calendar_events
         
-        logger.info(f"Encontrados {len(calendar_events)} eventos no Outlook")
-    return calendar_events
+        logger.info(f"Encontrados {total} eventos no Outlook")
+    
+    def get_events(self, time_min: Optional[datetime.datetime] = None, 
+                time_max: Optional[datetime.datetime] = None) -> List[CalendarEvent]:
+        """Obtém eventos do Outlook Calendar."""
+        return list(self.iter_events(time_min, time_max))
         
     def create_event(self, event: CalendarEvent) -> CalendarEvent:
-            """Cria um novo evento no Outlook Calendar."""
-            outlook_event = self._convert_from_calendar_event(event)
+        """Cria um novo evento no Outlook Calendar."""
+        outlook_event = self._convert_from_calendar_event(event)
         
-            logger.info(f"Criando evento no Outlook: {event.summary}")
+        logger.info(f"Criando evento no Outlook: {event.summary}")
         
-            if outlook_event.save():
-                # Atualiza o ID do evento com o ID retornado pelo Outlook
-                event.id = outlook_event.object_id
-                event.source_id = outlook_event.object_id
-                logger.info(f"Evento criado com sucesso no Outlook: {event.id}")
-            else:
-                logger.error("Falha ao criar evento no Outlook")
-                raise Exception("Falha ao criar evento no Outlook")
+        if outlook_event.save():
+            # Atualiza o ID do evento com o ID retornado pelo Outlook
+            event.id = outlook_event.object_id
+            event.source_id = outlook_event.object_id
+            logger.info(f"Evento criado com sucesso no Outlook: {event.id}")
+        else:
+            logger.error("Falha ao criar evento no Outlook")
+            raise Exception("Falha ao criar evento no Outlook")
         
-    return event
+        return event
 
     def update_event(self, event: CalendarEvent) -> CalendarEvent:
         """Atualiza um evento existente no Outlook Calendar."""
@@ -194,7 +379,7 @@ class OutlookAdapter:
             logger.error("Falha ao atualizar evento no Outlook")
             raise Exception("Falha ao atualizar evento no Outlook")
         
-    return event
+        return event
 
     def delete_event(self, event_id: str) -> bool:
         """Exclui um evento do Outlook Calendar."""
@@ -213,4 +398,4 @@ class OutlookAdapter:
             return True
         else:
             logger.error(f"Falha ao excluir evento do Outlook: {event_id}")
-    return False
\ No newline at end of file
+            return False
\ No newline at end of file
@@ -1,5 +1,6 @@
 import os # utilizado para limpar o terminal
 from dotenv import load_dotenv # utilizado para carregar as variaveis de ambiente
+from typing import Optional # typing é utilizado para definir tipos de dados
 from pydantic import BaseModel # basemodel é uma classe que permite criar classes com tipos de dados
 
 load_dotenv() # carregando as variáveis de ambiente
@@ -10,6 +11,8 @@ class GmailConfig(BaseModel):
     token_file: str = os.getenv("GMAIL_TOKEN_FILE", "token.json")
     scopes: list = ["https://www.googleapis.com/auth/calendar"]
     calendar_id: str = os.getenv("GMAIL_CALENDAR_ID", "primary")
+    calls_per_cycle: int = int(os.getenv("GMAIL_CALLS_PER_CYCLE", "500"))
+    daily_quota: int = int(os.getenv("GMAIL_DAILY_QUOTA", "10000"))
 
 # Configuração do Outlook
 class OutlookConfig(BaseModel):
@@ -17,12 +20,53 @@ class OutlookConfig(BaseModel):
     client_secret: str = os.getenv("OUTLOOK_CLIENT_SECRET", "")
     tenant_id: str = os.getenv("OUTLOOK_TENANT_ID", "")
     calendar_id: str = os.getenv("OUTLOOK_CALENDAR_ID", "")
+    token_file: str = os.getenv("OUTLOOK_TOKEN_FILE", "o365_token.txt")
+    calls_per_cycle: int = int(os.getenv("OUTLOOK_CALLS_PER_CYCLE", "500"))
+    daily_quota: int = int(os.getenv("OUTLOOK_DAILY_QUOTA", "10000"))
+
+# Configuração de uma faixa de sincronização (eventos até `horizon_hours` à frente,
+# sincronizados a cada `interval_minutes`)
+class SyncTierConfig(BaseModel):
+    name: str
+    horizon_hours: int
+    interval_minutes: int
+
+def parse_sync_tiers(value: str) -> list:
+    """Converte "nome:horizonte_horas:intervalo_minutos,..." em faixas ordenadas pelo horizonte."""
+    tiers = []
+    for item in value.split(","):
+        name, horizon_hours, interval_minutes = item.strip().split(":")
+        tiers.append(SyncTierConfig(name=name, horizon_hours=int(horizon_hours),
+                                    interval_minutes=int(interval_minutes)))
+    return sorted(tiers, key=lambda tier: tier.horizon_hours)
+
+# Faixas padrão: próximas 24h a cada minuto, próximas 2 semanas a cada 10 minutos e o restante a cada hora
+DEFAULT_SYNC_TIERS = "proximas_24h:24:1,proximas_2_semanas:336:10,demais:2160:60"
+
+def default_sync_tiers() -> list:
+    """
+    Faixas usadas quando SYNC_TIERS não está definido.
+    
+    Se o antigo SYNC_INTERVAL_MINUTES estiver definido, ele limita o intervalo das
+    faixas padrão, de modo que nenhum evento seja sincronizado com menos frequência que antes.
+    """
+    tiers = parse_sync_tiers(DEFAULT_SYNC_TIERS)
+    legacy_interval = os.getenv("SYNC_INTERVAL_MINUTES")
+    if legacy_interval:
+        for tier in tiers:
+            tier.interval_minutes = min(tier.interval_minutes, int(legacy_interval))
+    return tiers
 
 # Configuração de sincronização
 class SyncConfig(BaseModel):
-    sync_interval_minutes: int = int(os.getenv("SYNC_INTERVAL_MINUTES", "30"))
+    tiers: list = parse_sync_tiers(os.getenv("SYNC_TIERS")) if os.getenv("SYNC_TIERS") else default_sync_tiers()
+    sync_interval_minutes: Optional[int] = int(os.getenv("SYNC_INTERVAL_MINUTES")) if os.getenv("SYNC_INTERVAL_MINUTES") else None # obsoleto: substituído por SYNC_TIERS
     last_sync_file: str = os.getenv("LAST_SYNC_FILE", "last_sync.json")
+    quota_usage_file: str = os.getenv("QUOTA_USAGE_FILE", "quota_usage.json")
     log_level: str = os.getenv("LOG_LEVEL", "INFO")
+    detail_cache_size: int = int(os.getenv("DETAIL_CACHE_SIZE", "20000"))
+    merge_window_hours: int = int(os.getenv("MERGE_WINDOW_HOURS", "24"))
+    token_refresh_margin_minutes: int = int(os.getenv("TOKEN_REFRESH_MARGIN_MINUTES", "10"))
     
 # Classe principal de configuração
 class config(BaseModel):
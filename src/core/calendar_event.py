@@ -1,6 +1,7 @@
 from datetime import datetime # datatime é utilizado para manipular datas e horas.
-from typing import Optional, List, Dict, Any # typing é utilizado para definir tipos de dados.
+from typing import Optional, List, Dict, Any, Tuple # typing é utilizado para definir tipos de dados.
 from pydantic import BaseModel, Field # pydantic é utilizado para definir modelos de dados.
+from .people import people # people é a tabela compartilhada de participantes e organizadores.
 
 class CalendarEvent(BaseModel):
     """
@@ -10,18 +11,46 @@ class CalendarEvent(BaseModel):
     id: str
     summary: str
     description: Optional[str] = None
-    localization: Optional[str] = None
+    location: Optional[str] = None
     start_time: datetime
     end_time: datetime
     is_all_day: bool = False
     recurrence: Optional[List[str]] = None
-    attendees: Optional[List[Dict[str, str]]] = None
-    organizer: Optional[Dict[str, str]] = None
+    # Participantes e organizador são referências para a tabela `people`;
+    # o status de resposta fica separado, indexado pelo ID do participante.
+    attendee_ids: Optional[Tuple[int, ...]] = None
+    attendee_responses: Optional[Dict[int, str]] = None
+    organizer_id: Optional[int] = None
     status: str = "confirmed"
     created: datetime = Field(default_factory=datetime.now)
     updated: datetime = Field(default_factory=datetime.now)
     source: str  
     source_id: str  
+    version: Optional[str] = None # etag (Gmail) ou data de modificação (Outlook), usado para o cache de detalhes
 
     class Config: 
         arbitrary_types_allowed = True
+
+    @property
+    def attendees(self) -> Optional[List[Dict[str, str]]]:
+        """Reconstrói a lista de participantes no formato de dicionários."""
+        if self.attendee_ids is None:
+            return None
+        responses = self.attendee_responses or {}
+        attendees = []
+        for person_id in self.attendee_ids:
+            person = people.get(person_id)
+            attendees.append({
+                'email': person.email,
+                'name': person.name,
+                'response_status': responses.get(person_id, '')
+            })
+        return attendees
+
+    @property
+    def organizer(self) -> Optional[Dict[str, str]]:
+        """Reconstrói o organizador no formato de dicionário."""
+        if self.organizer_id is None:
+            return None
+        person = people.get(self.organizer_id)
+        return {'email': person.email, 'name': person.name}
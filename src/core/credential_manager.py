@@ -0,0 +1,100 @@
+import datetime # datetime é utilizado para manipular datas e horas.
+import threading # threading é utilizado para executar a renovação em segundo plano.
+from typing import Callable, Dict, NamedTuple, Optional # typing é utilizado para definir tipos de dados.
+import pytz # pytz é utilizado para manipular fusos horários.
+from ..config.settings import config # config é utilizado para acessar as configurações do sistema.
+from ..utils.logger import logger # logger é utilizado para registrar as renovações.
+
+
+class TokenProvider(NamedTuple):
+    """Provedor de token registrado no gerenciador."""
+
+    expires_at: Callable[[], Optional[datetime.datetime]] # expiração do token atual (UTC), ou None se desconhecida
+    refresh: Callable[[], None] # renova o token (ou adota um token renovado por outro processo)
+
+
+class CredentialManager:
+    """
+    Renova os tokens dos provedores em segundo plano, antes da expiração.
+
+    Cada adaptador registra como consultar a expiração do seu token e como
+    renová-lo; a thread de renovação garante que nenhuma requisição precise
+    esperar por uma renovação. A persistência atômica e o bloqueio entre
+    processos ficam a cargo de cada provedor.
+    """
+
+    def __init__(self, refresh_margin: datetime.timedelta,
+                 check_interval: datetime.timedelta = datetime.timedelta(minutes=1)):
+        self.refresh_margin = refresh_margin
+        self.check_interval = check_interval
+        self._providers: Dict[str, TokenProvider] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def register(self, name: str, expires_at: Callable[[], Optional[datetime.datetime]],
+                 refresh: Callable[[], None]):
+        """Registra (ou substitui) um provedor de token."""
+        self._providers[name] = TokenProvider(expires_at, refresh)
+        self._locks.setdefault(name, threading.Lock())
+
+    def refresh_if_needed(self, name: str, force: bool = False) -> bool:
+        """Renova o token do provedor se ele estiver dentro da margem de expiração."""
+        provider = self._providers[name]
+        with self._locks[name]:
+            expires_at = provider.expires_at()
+            now = datetime.datetime.now(pytz.UTC)
+            if not force and expires_at is not None and expires_at - self.refresh_margin > now:
+                return False
+
+            logger.info(f"Renovando token do {name} (expira em {expires_at.isoformat() if expires_at else 'desconhecido'})")
+            provider.refresh()
+            return True
+
+    def refresh_all(self):
+        """Verifica todos os provedores, renovando os tokens próximos da expiração."""
+        for name in list(self._providers):
+            try:
+                self.refresh_if_needed(name)
+            except Exception as e:
+                logger.error(f"Erro ao renovar token do {name}: {e}")
+
+    def _seconds_until_next_check(self) -> float:
+        """Calcula quanto tempo aguardar até a próxima renovação prevista."""
+        wait = self.check_interval.total_seconds()
+        now = datetime.datetime.now(pytz.UTC)
+        for provider in self._providers.values():
+            try:
+                expires_at = provider.expires_at()
+            except Exception:
+                continue
+            if expires_at is not None:
+                wait = min(wait, (expires_at - self.refresh_margin - now).total_seconds())
+        return max(wait, 30.0)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.refresh_all()
+            self._stop.wait(self._seconds_until_next_check())
+
+    def start(self):
+        """Inicia a thread de renovação em segundo plano."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='credential-manager', daemon=True)
+        self._thread.start()
+        logger.info("Renovação de tokens em segundo plano iniciada")
+
+    def stop(self):
+        """Interrompe a thread de renovação."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+
+# Instância global compartilhada pelos adaptadores
+credential_manager = CredentialManager(
+    refresh_margin=datetime.timedelta(minutes=config.sync.token_refresh_margin_minutes)
+)
@@ -0,0 +1,49 @@
+from collections import OrderedDict # OrderedDict é utilizado para descartar as entradas menos usadas.
+from typing import Dict, NamedTuple, Optional, Tuple # typing é utilizado para definir tipos de dados.
+from .calendar_event import CalendarEvent # CalendarEvent é o modelo que recebe os campos pesados.
+
+
+class EventDetails(NamedTuple):
+    """Campos pesados de um evento (corpo, participantes e organizador)."""
+
+    version: str
+    description: Optional[str]
+    attendee_ids: Optional[Tuple[int, ...]]
+    attendee_responses: Optional[Dict[int, str]]
+    organizer_id: Optional[int]
+
+    def apply_to(self, event: CalendarEvent) -> CalendarEvent:
+        """Copia os campos pesados para um evento carregado com a projeção leve."""
+        event.description = self.description
+        event.attendee_ids = self.attendee_ids
+        event.attendee_responses = self.attendee_responses
+        event.organizer_id = self.organizer_id
+        return event
+
+
+class EventDetailsCache:
+    """
+    Cache dos campos pesados por evento, indexado pela versão (etag ou data de modificação).
+
+    Só é preciso buscar novamente os detalhes de um evento quando a versão
+    retornada pela listagem leve for diferente da versão armazenada.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, EventDetails]" = OrderedDict()
+
+    def get(self, source_id: str, version: Optional[str]) -> Optional[EventDetails]:
+        """Retorna os detalhes em cache se a versão ainda for a mesma."""
+        details = self._entries.get(source_id)
+        if details is None or version is None or details.version != version:
+            return None
+        self._entries.move_to_end(source_id)
+        return details
+
+    def put(self, source_id: str, details: EventDetails):
+        """Armazena os detalhes de um evento, descartando os mais antigos se necessário."""
+        self._entries[source_id] = details
+        self._entries.move_to_end(source_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
@@ -0,0 +1,140 @@
+import datetime # datetime é utilizado para manipular datas e horas.
+import heapq # heapq.merge é utilizado para intercalar os dois fluxos ordenados.
+import itertools # itertools.count gera um desempate estável para o merge.
+from collections import OrderedDict # OrderedDict mantém os eventos pendentes em ordem de início.
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple # typing é utilizado para definir tipos de dados.
+import pytz # pytz é utilizado para manipular fusos horários.
+from .calendar_event import CalendarEvent # CalendarEvent é o modelo comparado.
+
+GMAIL = 'gmail'
+OUTLOOK = 'outlook'
+
+
+class SyncDecision(NamedTuple):
+    """Decisão de sincronização emitida pelo merge: criar ou atualizar um evento em um dos lados."""
+
+    action: str # 'create' ou 'update'
+    target: str # calendário onde a escrita deve ser feita ('gmail' ou 'outlook')
+    event: CalendarEvent
+
+
+def event_sort_key(event: CalendarEvent) -> datetime.datetime:
+    """Chave de ordenação por início; datas sem fuso (dia inteiro) são tratadas como UTC."""
+    start_time = event.start_time
+    if start_time.tzinfo is None:
+        return pytz.UTC.localize(start_time)
+    return start_time
+
+
+class _PendingEvents:
+    """Eventos de um lado ainda sem correspondente, em ordem de início."""
+
+    def __init__(self):
+        self.by_id: "OrderedDict[str, Tuple[datetime.datetime, str, CalendarEvent]]" = OrderedDict()
+        self.by_fingerprint: Dict[str, List[str]] = {}
+
+    def add(self, key: datetime.datetime, fingerprint: str, event: CalendarEvent):
+        self.by_id[event.source_id] = (key, fingerprint, event)
+        self.by_fingerprint.setdefault(fingerprint, []).append(event.source_id)
+
+    def pop_by_id(self, source_id: str) -> Optional[Tuple[datetime.datetime, str, CalendarEvent]]:
+        entry = self.by_id.pop(source_id, None)
+        if entry is not None:
+            self._forget_fingerprint(entry[1], source_id)
+        return entry
+
+    def pop_by_fingerprint(self, fingerprint: str) -> Optional[Tuple[datetime.datetime, str, CalendarEvent]]:
+        ids = self.by_fingerprint.get(fingerprint)
+        if not ids:
+            return None
+        return self.pop_by_id(ids[0])
+
+    def pop_older_than(self, watermark: datetime.datetime) -> Iterator[CalendarEvent]:
+        while self.by_id:
+            source_id, (key, fingerprint, event) = next(iter(self.by_id.items()))
+            if key >= watermark:
+                break
+            self.by_id.popitem(last=False)
+            self._forget_fingerprint(fingerprint, source_id)
+            yield event
+
+    def pop_all(self) -> Iterator[CalendarEvent]:
+        while self.by_id:
+            source_id, (_, fingerprint, event) = self.by_id.popitem(last=False)
+            self._forget_fingerprint(fingerprint, source_id)
+            yield event
+
+    def _forget_fingerprint(self, fingerprint: str, source_id: str):
+        ids = self.by_fingerprint.get(fingerprint)
+        if ids:
+            ids.remove(source_id)
+            if not ids:
+                del self.by_fingerprint[fingerprint]
+
+    def __len__(self) -> int:
+        return len(self.by_id)
+
+
+class StreamingMerger:
+    """
+    Compara dois fluxos de eventos ordenados por início, como um merge de listas ordenadas.
+
+    Eventos com o mesmo ID ou a mesma impressão digital são pareados enquanto
+    estiverem dentro da janela deslizante; um evento que sai da janela sem
+    correspondente gera uma criação no outro calendário. A memória fica
+    limitada aos eventos pendentes na janela, e não ao total de eventos.
+    """
+
+    def __init__(self, fingerprint: Callable[[CalendarEvent], str], window: datetime.timedelta):
+        self.fingerprint = fingerprint
+        self.window = window
+        self.peak_pending = 0
+
+    def merge(self, gmail_events: Iterable[CalendarEvent],
+              outlook_events: Iterable[CalendarEvent]) -> Iterator[SyncDecision]:
+        """Intercala os dois fluxos e emite as decisões de sincronização à medida que surgem."""
+        counter = itertools.count()
+        merged = heapq.merge(
+            ((event_sort_key(event), next(counter), GMAIL, event) for event in gmail_events),
+            ((event_sort_key(event), next(counter), OUTLOOK, event) for event in outlook_events)
+        )
+        pending = {GMAIL: _PendingEvents(), OUTLOOK: _PendingEvents()}
+        self.peak_pending = 0
+
+        for key, _, side, event in merged:
+            other_side = OUTLOOK if side == GMAIL else GMAIL
+            fingerprint = self.fingerprint(event)
+
+            match = pending[other_side].pop_by_id(event.source_id)
+            if match is not None:
+                decision = self._resolve_update(side, event, fingerprint, match[2], match[1])
+                if decision is not None:
+                    yield decision
+            elif pending[other_side].pop_by_fingerprint(fingerprint) is None:
+                pending[side].add(key, fingerprint, event)
+
+            self.peak_pending = max(self.peak_pending, len(pending[GMAIL]) + len(pending[OUTLOOK]))
+
+            # Eventos que saíram da janela não têm mais como ser pareados
+            watermark = key - self.window
+            for expired in pending[GMAIL].pop_older_than(watermark):
+                yield SyncDecision('create', OUTLOOK, expired)
+            for expired in pending[OUTLOOK].pop_older_than(watermark):
+                yield SyncDecision('create', GMAIL, expired)
+
+        for remaining in pending[GMAIL].pop_all():
+            yield SyncDecision('create', OUTLOOK, remaining)
+        for remaining in pending[OUTLOOK].pop_all():
+            yield SyncDecision('create', GMAIL, remaining)
+
+    def _resolve_update(self, side: str, event: CalendarEvent, fingerprint: str,
+                        other_event: CalendarEvent, other_fingerprint: str) -> Optional[SyncDecision]:
+        """Decide qual lado deve ser atualizado quando o mesmo evento difere entre os calendários."""
+        if fingerprint == other_fingerprint:
+            return None
+
+        gmail_event, outlook_event = (event, other_event) if side == GMAIL else (other_event, event)
+        # O evento modificado mais recentemente prevalece
+        if gmail_event.updated > outlook_event.updated:
+            return SyncDecision('update', OUTLOOK, gmail_event)
+        return SyncDecision('update', GMAIL, outlook_event)
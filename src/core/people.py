@@ -0,0 +1,84 @@
+import sys # sys.intern é utilizado para compartilhar strings repetidas (status de resposta).
+import threading # threading é utilizado para proteger a tabela contra acesso concorrente.
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple, Union # typing é utilizado para definir tipos de dados.
+
+# Vocabulário comum dos status de resposta dos participantes; cada adaptador
+# converte o status do seu provedor para estes valores e vice-versa.
+RESPONSE_ACCEPTED = 'accepted'
+RESPONSE_DECLINED = 'declined'
+RESPONSE_TENTATIVE = 'tentative'
+RESPONSE_NEEDS_ACTION = 'needs_action'
+
+
+class Person(NamedTuple):
+    """Pessoa (participante ou organizador) compartilhada entre todos os eventos."""
+
+    email: str
+    name: str
+
+
+class PeopleRegistry:
+    """
+    Tabela de internação de pessoas.
+
+    Cada pessoa é identificada pelo email normalizado (ou, sem email, como salas e
+    recursos, também pelo nome), armazenada uma única vez e referenciada nos eventos
+    por um ID inteiro, de modo que milhares de ocorrências da mesma reunião recorrente
+    compartilham os mesmos objetos em vez de manter cópias de dicts. O mesmo email recebe o mesmo ID no Gmail e no Outlook, mesmo
+    que apenas um dos provedores informe o nome.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids: Dict[Union[str, Tuple[str, str]], int] = {}
+        self._people: List[Person] = []
+
+    def intern(self, email: Optional[str], name: Optional[str] = None) -> int:
+        """Retorna o ID da pessoa, registrando-a se ainda não existir."""
+        email = (email or '').strip().lower()
+        name = (name or '').strip()
+        # Participantes sem email só podem ser distinguidos pelo nome
+        key = email if email else (email, name)
+        person_id = self._ids.get(key)
+        if person_id is not None and (not name or self._people[person_id].name):
+            return person_id
+
+        with self._lock:
+            person_id = self._ids.get(key)
+            if person_id is None:
+                person_id = len(self._people)
+                self._people.append(Person(sys.intern(email), sys.intern(name)))
+                self._ids[key] = person_id
+            elif name and not self._people[person_id].name:
+                # Completa o nome quando a pessoa foi vista antes sem ele
+                self._people[person_id] = Person(self._people[person_id].email, sys.intern(name))
+        return person_id
+
+    def intern_attendees(self, attendees: Iterable[Tuple[Optional[str], Optional[str], Optional[str]]]
+                         ) -> Tuple[Tuple[int, ...], Dict[int, str]]:
+        """
+        Interna uma lista de participantes no formato (email, nome, status).
+
+        Retorna:
+            - tupla com os IDs dos participantes, na ordem original
+            - dicionário ID -> status de resposta
+        """
+        ids = []
+        responses = {}
+        for email, name, response_status in attendees:
+            person_id = self.intern(email, name)
+            ids.append(person_id)
+            if response_status:
+                responses[person_id] = sys.intern(response_status)
+        return tuple(ids), responses
+
+    def get(self, person_id: int) -> Person:
+        """Obtém a pessoa correspondente a um ID."""
+        return self._people[person_id]
+
+    def __len__(self) -> int:
+        return len(self._people)
+
+
+# Instância global compartilhada pelos adaptadores
+people = PeopleRegistry()
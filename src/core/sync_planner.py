@@ -0,0 +1,262 @@
+import datetime # datetime é utilizado para manipular datas e horas.
+import json # json é utilizado para estimar o tamanho das requisições e salvar o consumo de cota.
+import math # math.ceil é utilizado para contar os lotes de requisições.
+from typing import Dict, List, NamedTuple, Optional, Set # typing é utilizado para definir tipos de dados.
+import pytz # pytz é utilizado para manipular fusos horários.
+from pydantic import BaseModel, Field # pydantic é utilizado para tornar o plano serializável.
+from .calendar_event import CalendarEvent # CalendarEvent é o evento a ser escrito.
+from .merge_diff import GMAIL, OUTLOOK, SyncDecision # decisões emitidas pelo merge.
+from .sync_tiers import SyncTier, WriteQueue # faixas e fila de prioridade das escritas.
+from ..utils.logger import logger # logger é utilizado para registrar o consumo de cota.
+from ..utils.token_store import atomic_write, read_text # escrita atômica do consumo de cota.
+
+
+# Situação de uma operação após a seleção pelo orçamento do ciclo
+RUNNABLE = 'runnable' # cabe no orçamento e é executada neste ciclo
+DEFERRED = 'deferred' # não cabe e fica para os próximos ciclos
+
+
+class ProviderCost(NamedTuple):
+    """Custo das escritas em um provedor."""
+
+    create_calls: int # chamadas de API para criar um evento
+    update_calls: int # chamadas de API para atualizar um evento
+    batch_size: int # escritas agrupadas por requisição HTTP (1 se o provedor não usa lotes)
+    request_overhead_bytes: int # cabeçalhos e envelope de cada requisição HTTP
+
+
+# Quantidade máxima de escritas por lote HTTP no Gmail (recomendação da API do Google).
+GMAIL_WRITE_BATCH_SIZE = 50
+
+PROVIDER_COSTS = {
+    # Inserções e atualizações são enviadas em lotes HTTP; cada item conta na cota.
+    GMAIL: ProviderCost(create_calls=1, update_calls=1, batch_size=GMAIL_WRITE_BATCH_SIZE, request_overhead_bytes=800),
+    # O cliente O365 não agrupa requisições; a atualização busca o evento antes de salvá-lo.
+    OUTLOOK: ProviderCost(create_calls=1, update_calls=2, batch_size=1, request_overhead_bytes=1200),
+}
+
+
+class PlannedOperation(BaseModel):
+    """Escrita planejada, com a estimativa de custo."""
+
+    action: str
+    target: str
+    tier: str
+    priority: int
+    source_id: str
+    summary: str
+    start_time: datetime.datetime
+    estimated_calls: int
+    estimated_bytes: int
+    schedule: Optional[str] = None # RUNNABLE ou DEFERRED, preenchido pela seleção do orçamento
+    event: CalendarEvent = Field(exclude=True)
+
+    def to_decision(self) -> SyncDecision:
+        return SyncDecision(self.action, self.target, self.event)
+
+
+class ProviderEstimate(BaseModel):
+    """Totais estimados de um provedor em um plano."""
+
+    operations: int = 0
+    deferred: int = 0
+    calls: int = 0
+    http_requests: int = 0
+    bytes: int = 0
+
+
+class SyncPlan(BaseModel):
+    """Plano de sincronização serializável: escritas em ordem de prioridade e estimativas por provedor."""
+
+    created_at: datetime.datetime = Field(default_factory=lambda: datetime.datetime.now(pytz.UTC))
+    operations: List[PlannedOperation] = []
+
+    @property
+    def estimates(self) -> Dict[str, ProviderEstimate]:
+        """Totais por provedor, considerando o agrupamento das escritas em lotes."""
+        estimates = {GMAIL: ProviderEstimate(), OUTLOOK: ProviderEstimate()}
+        for operation in self.operations:
+            estimate = estimates[operation.target]
+            estimate.operations += 1
+            if operation.schedule == DEFERRED:
+                estimate.deferred += 1
+            estimate.calls += operation.estimated_calls
+            estimate.bytes += operation.estimated_bytes
+
+        for target, estimate in estimates.items():
+            cost = PROVIDER_COSTS[target]
+            batches = math.ceil(estimate.operations / cost.batch_size)
+            if cost.batch_size > 1:
+                # As chamadas de um lote compartilham uma única requisição HTTP
+                estimate.http_requests = batches
+            else:
+                estimate.http_requests = estimate.calls
+            estimate.bytes += estimate.http_requests * cost.request_overhead_bytes
+        return estimates
+
+    def to_json(self) -> str:
+        data = self.model_dump(mode='json')
+        data['estimates'] = {target: estimate.model_dump() for target, estimate in self.estimates.items()}
+        return json.dumps(data, indent=2, ensure_ascii=False)
+
+    def __len__(self) -> int:
+        return len(self.operations)
+
+
+class SyncPlanner:
+    """Transforma as decisões de sincronização em um plano com estimativas de custo."""
+
+    def estimate_bytes(self, event: CalendarEvent) -> int:
+        """Estima o tamanho do corpo da requisição de escrita de um evento."""
+        payload = {
+            'summary': event.summary,
+            'description': event.description,
+            'location': event.location,
+            'start': event.start_time.isoformat(),
+            'end': event.end_time.isoformat(),
+            'recurrence': event.recurrence,
+            'attendees': event.attendees,
+        }
+        return len(json.dumps(payload, ensure_ascii=False).encode('utf-8'))
+
+    def plan_operation(self, tier: SyncTier, decision: SyncDecision) -> PlannedOperation:
+        """Cria a operação planejada para uma decisão."""
+        cost = PROVIDER_COSTS[decision.target]
+        calls = cost.create_calls if decision.action == 'create' else cost.update_calls
+        payload_bytes = self.estimate_bytes(decision.event)
+        return PlannedOperation(
+            action=decision.action,
+            target=decision.target,
+            tier=tier.name,
+            priority=tier.priority,
+            source_id=decision.event.source_id,
+            summary=decision.event.summary,
+            start_time=decision.event.start_time,
+            estimated_calls=calls,
+            # Na atualização do Outlook, o evento existente também é baixado
+            estimated_bytes=payload_bytes * calls,
+            event=decision.event
+        )
+
+    def build(self, queue: WriteQueue) -> SyncPlan:
+        """Esvazia a fila de escritas, gerando o plano em ordem de prioridade."""
+        operations = []
+        while queue:
+            tier, decision = queue.pop()
+            operations.append(self.plan_operation(tier, decision))
+        return SyncPlan(operations=operations)
+
+
+class QuotaTracker:
+    """Registra as chamadas de API consumidas por provedor no dia (UTC), persistidas em arquivo."""
+
+    def __init__(self, usage_file: str, daily_quotas: Dict[str, int]):
+        self.usage_file = usage_file
+        self.daily_quotas = daily_quotas
+        self.day = None
+        self.usage: Dict[str, int] = {}
+        self._load()
+
+    def _today(self) -> str:
+        return datetime.datetime.now(pytz.UTC).date().isoformat()
+
+    def _load(self):
+        self.day = self._today()
+        self.usage = {}
+        try:
+            content = read_text(self.usage_file)
+            if content:
+                data = json.loads(content)
+                if data.get('day') == self.day:
+                    self.usage = data.get('usage', {})
+        except Exception as e:
+            logger.error(f"Erro ao carregar o consumo de cota: {e}")
+
+    def _roll_day(self):
+        if self.day != self._today():
+            self.day = self._today()
+            self.usage = {}
+
+    def remaining(self, target: str) -> int:
+        """Chamadas ainda disponíveis hoje para o provedor."""
+        self._roll_day()
+        return self.daily_quotas[target] - self.usage.get(target, 0)
+
+    def spend(self, target: str, calls: int):
+        """Registra chamadas consumidas e salva o consumo."""
+        self._roll_day()
+        self.usage[target] = self.usage.get(target, 0) + calls
+        atomic_write(self.usage_file, json.dumps({'day': self.day, 'usage': self.usage}))
+
+
+class BudgetedExecutor:
+    """
+    Seleciona, por prioridade, as operações que cabem no orçamento do ciclo.
+
+    As operações que não couberem não são guardadas: como os eventos podem mudar
+    até o próximo ciclo, apenas a faixa de origem é marcada com escritas pendentes
+    (`backlog`), para que seja planejada novamente a partir do estado atual antes de escrever.
+    """
+
+    def __init__(self, cycle_budgets: Dict[str, int], quota: QuotaTracker):
+        self.cycle_budgets = cycle_budgets
+        self.quota = quota
+        self.cycle_spent: Dict[str, int] = {}
+        # Reservas das seleções simuladas (dry-run), que não consomem o orçamento real
+        self.simulated_spent: Dict[str, int] = {}
+        self.backlog: Set[str] = set()
+
+    def start_cycle(self):
+        """Reinicia o orçamento do ciclo."""
+        self.cycle_spent = {}
+        self.simulated_spent = {}
+
+    def available(self, target: str) -> int:
+        """Chamadas disponíveis para o provedor no ciclo atual, respeitando a cota diária."""
+        cycle_remaining = self.cycle_budgets[target] - self.cycle_spent.get(target, 0)
+        return max(0, min(cycle_remaining, self.quota.remaining(target)))
+
+    def exhausted(self) -> List[str]:
+        """Provedores sem nenhuma chamada disponível no ciclo atual, nem mesmo para leituras."""
+        return [target for target in self.cycle_budgets if self.available(target) == 0]
+
+    def charge(self, target: str, calls: int):
+        """Desconta chamadas já feitas (como as leituras dos adaptadores) do ciclo e da cota diária."""
+        self.cycle_spent[target] = self.cycle_spent.get(target, 0) + calls
+        self.quota.spend(target, calls)
+
+    def select(self, plan: SyncPlan, dry_run: bool = False) -> SyncPlan:
+        """
+        Retorna a parte do plano executável neste ciclo, em ordem de prioridade.
+
+        Cada operação do plano é marcada como RUNNABLE ou DEFERRED. As chamadas das
+        operações selecionadas são reservadas no orçamento ao selecioná-las, e as faixas
+        das operações que não couberem são marcadas em `backlog`. Em simulação
+        (`dry_run`), as reservas ficam em uma cópia do orçamento e nada é consumido.
+        """
+        reserved: Dict[str, int] = {}
+        runnable = []
+        deferred = 0
+        for operation in plan.operations:
+            target = operation.target
+            available = self.available(target) - self.simulated_spent.get(target, 0)
+            if reserved.get(target, 0) + operation.estimated_calls <= available:
+                reserved[target] = reserved.get(target, 0) + operation.estimated_calls
+                operation.schedule = RUNNABLE
+                runnable.append(operation)
+            else:
+                deferred += 1
+                operation.schedule = DEFERRED
+                if not dry_run:
+                    self.backlog.add(operation.tier)
+
+        for target, calls in reserved.items():
+            if dry_run:
+                self.simulated_spent[target] = self.simulated_spent.get(target, 0) + calls
+            else:
+                # As chamadas selecionadas já são descontadas do orçamento do ciclo e da cota diária
+                self.charge(target, calls)
+
+        if deferred and not dry_run:
+            logger.warning(f"{deferred} operações adiadas por limite de cota; suas faixas serão planejadas novamente")
+        return SyncPlan(created_at=plan.created_at, operations=runnable)
@@ -0,0 +1,88 @@
+import datetime # datetime é utilizado para manipular datas e horas.
+import heapq # heapq é utilizado para a fila de prioridade das escritas.
+import itertools # itertools.count gera um desempate estável para a fila.
+from typing import Dict, List, Optional, Tuple # typing é utilizado para definir tipos de dados.
+from .merge_diff import SyncDecision, event_sort_key # SyncDecision é a escrita enfileirada.
+
+# Quanto tempo antes do cursor a faixa mais próxima volta a buscar eventos
+LOOKBACK = datetime.timedelta(days=1)
+
+
+class SyncTier:
+    """
+    Faixa de sincronização: um intervalo de datas à frente com cadência e cursor próprios.
+
+    A faixa cobre eventos com início entre `start_offset` e `end_offset` a partir
+    de agora; a primeira faixa também volta `LOOKBACK` antes do seu cursor.
+    """
+
+    def __init__(self, name: str, priority: int, start_offset: Optional[datetime.timedelta],
+                 end_offset: datetime.timedelta, interval: datetime.timedelta,
+                 last_run: Optional[datetime.datetime] = None):
+        self.name = name
+        self.priority = priority
+        self.start_offset = start_offset # None na primeira faixa
+        self.end_offset = end_offset
+        self.interval = interval
+        self.last_run = last_run
+
+    def window(self, now: datetime.datetime) -> Tuple[datetime.datetime, datetime.datetime]:
+        """Retorna o intervalo [início, fim) de datas coberto pela faixa."""
+        if self.start_offset is None:
+            cursor = min(self.last_run, now) if self.last_run else now
+            time_min = cursor - LOOKBACK
+        else:
+            time_min = now + self.start_offset
+        return time_min, now + self.end_offset
+
+    def next_run(self) -> Optional[datetime.datetime]:
+        """Retorna quando a faixa deve ser sincronizada novamente (None se nunca foi)."""
+        if self.last_run is None:
+            return None
+        return self.last_run + self.interval
+
+    def is_due(self, now: datetime.datetime) -> bool:
+        """Indica se a faixa já deve ser sincronizada."""
+        next_run = self.next_run()
+        return next_run is None or next_run <= now
+
+    def __repr__(self):
+        return f"SyncTier({self.name}, a cada {self.interval})"
+
+
+def build_tiers(tier_configs: list, cursors: Dict[str, str]) -> List[SyncTier]:
+    """Cria as faixas a partir da configuração, restaurando os cursores salvos."""
+    tiers = []
+    previous_end = None
+    for priority, tier_config in enumerate(tier_configs):
+        end_offset = datetime.timedelta(hours=tier_config.horizon_hours)
+        last_run = cursors.get(tier_config.name)
+        tiers.append(SyncTier(
+            name=tier_config.name,
+            priority=priority,
+            start_offset=previous_end,
+            end_offset=end_offset,
+            interval=datetime.timedelta(minutes=tier_config.interval_minutes),
+            last_run=datetime.datetime.fromisoformat(last_run) if last_run else None
+        ))
+        previous_end = end_offset
+    return tiers
+
+
+class WriteQueue:
+    """Fila de prioridade das escritas: faixas mais próximas primeiro e, dentro delas, eventos mais cedo."""
+
+    def __init__(self):
+        self._heap = []
+        self._counter = itertools.count()
+
+    def push(self, tier: SyncTier, decision: SyncDecision):
+        heapq.heappush(self._heap, (tier.priority, event_sort_key(decision.event),
+                                    next(self._counter), tier, decision))
+
+    def pop(self) -> Tuple[SyncTier, SyncDecision]:
+        _, _, _, tier, decision = heapq.heappop(self._heap)
+        return tier, decision
+
+    def __len__(self) -> int:
+        return len(self._heap)
@@ -2,42 +2,81 @@ import json
 import os
 import datetime
 import time
-from typing import Dict, List, Set, Tuple
+from typing import Dict, Iterable, Iterator, List, Optional, Set
 import pytz
 from ..adapters.gmail_adapter import GmailAdapter
 from ..adapters.outlook_adapter import OutlookAdapter
 from ..core.calendar_event import CalendarEvent
+from ..core.credential_manager import credential_manager
+from ..core.merge_diff import StreamingMerger, SyncDecision, event_sort_key
+from ..core.sync_planner import GMAIL_WRITE_BATCH_SIZE, BudgetedExecutor, PlannedOperation, QuotaTracker, SyncPlan, SyncPlanner
+from ..core.sync_tiers import SyncTier, WriteQueue, build_tiers
 from ..config.settings import config
 from ..utils.logger import logger
 
+# Quantidade máxima de decisões acumuladas antes de planejá-las e aplicá-las
+APPLY_CHUNK_SIZE = 100
+
 class CalendarSynchronizer:
     """Classe responsável por sincronizar eventos entre Gmail e Outlook."""
     
     def __init__(self):
-        self.gmail_adapter = GmailAdapter()
-        self.outlook_adapter = OutlookAdapter()
+        self.executor = BudgetedExecutor(
+            cycle_budgets={'gmail': config.gmail.calls_per_cycle, 'outlook': config.outlook.calls_per_cycle},
+            quota=QuotaTracker(
+                config.sync.quota_usage_file,
+                daily_quotas={'gmail': config.gmail.daily_quota, 'outlook': config.outlook.daily_quota}
+            )
+        )
+        # As leituras dos adaptadores também são descontadas do orçamento e da cota
+        self.gmail_adapter = GmailAdapter(on_api_calls=lambda calls: self.executor.charge('gmail', calls))
+        self.outlook_adapter = OutlookAdapter(on_api_calls=lambda calls: self.executor.charge('outlook', calls))
         self.last_sync_file = config.sync.last_sync_file
         self.last_sync_time = self._load_last_sync_time()
-        self.sync_interval = config.sync.sync_interval_minutes
+        self.merge_window = datetime.timedelta(hours=config.sync.merge_window_hours)
+        self.tiers = build_tiers(config.sync.tiers, self._load_tier_cursors())
+        self.planner = SyncPlanner()
+        if config.sync.sync_interval_minutes is not None:
+            logger.warning(
+                "SYNC_INTERVAL_MINUTES está obsoleto; use SYNC_TIERS. Ele só é considerado quando "
+                "SYNC_TIERS não está definido, limitando o intervalo das faixas padrão"
+            )
+        # Sem cursor salvo, a faixa mais próxima parte da última sincronização
+        if self.tiers and self.tiers[0].last_run is None:
+            self.tiers[0].last_run = self.last_sync_time
     
-    def _load_last_sync_time(self) -> datetime.datetime:
-        """Carrega o timestamp da última sincronização."""
+    def _load_sync_state(self) -> dict:
+        """Carrega o arquivo de estado da sincronização."""
         if os.path.exists(self.last_sync_file):
             try:
                 with open(self.last_sync_file, 'r') as f:
-                    data = json.load(f)
-                    return datetime.datetime.fromisoformat(data.get('last_sync', ''))
+                    return json.load(f)
+            except Exception as e:
+                logger.error(f"Erro ao carregar o estado da última sincronização: {e}")
+        return {}
+    
+    def _load_last_sync_time(self) -> datetime.datetime:
+        """Carrega o timestamp da última sincronização."""
+        last_sync = self._load_sync_state().get('last_sync')
+        if last_sync:
+            try:
+                return datetime.datetime.fromisoformat(last_sync)
             except Exception as e:
                 logger.error(f"Erro ao carregar timestamp da última sincronização: {e}")
         
         # Se o arquivo não existir ou ocorrer um erro, retorna uma data no passado
         return datetime.datetime.now(pytz.UTC) - datetime.timedelta(days=30)
     
+    def _load_tier_cursors(self) -> Dict[str, str]:
+        """Carrega o cursor (última execução) de cada faixa de sincronização."""
+        return self._load_sync_state().get('tiers', {})
+    
     def _save_last_sync_time(self):
-        """Salva o timestamp da sincronização atual."""
+        """Salva o timestamp da sincronização atual e os cursores das faixas."""
         now = datetime.datetime.now(pytz.UTC)
+        tiers = {tier.name: tier.last_run.isoformat() for tier in self.tiers if tier.last_run}
         with open(self.last_sync_file, 'w') as f:
-            json.dump({'last_sync': now.isoformat()}, f)
+            json.dump({'last_sync': now.isoformat(), 'tiers': tiers}, f)
         self.last_sync_time = now
     
     def _get_event_fingerprint(self, event: CalendarEvent) -> str:
@@ -55,75 +94,25 @@ class CalendarSynchronizer:
         )
         return fingerprint
     
-    def _compare_events(self, gmail_events: List[CalendarEvent], 
-                       outlook_events: List[CalendarEvent]) -> Tuple[Dict, Dict, Dict, Dict]:
+    def _stream_compare(self, gmail_events: Iterable[CalendarEvent],
+                        outlook_events: Iterable[CalendarEvent],
+                        incomplete_starts: Dict[str, Set[datetime.datetime]]) -> Iterator[SyncDecision]:
         """
-        Compara eventos entre Gmail e Outlook para determinar quais precisam ser sincronizados.
+        Compara os fluxos de eventos (ordenados por início) de forma incremental.
         
-        Retorna:
-            - eventos para criar no Gmail
-            - eventos para criar no Outlook
-            - eventos para atualizar no Gmail
-            - eventos para atualizar no Outlook
+        As decisões são emitidas à medida que o merge avança, com memória limitada
+        pela janela deslizante configurada em `merge_window_hours`. `incomplete_starts`
+        traz, por calendário, os inícios dos eventos descartados na listagem por falta de detalhes.
         """
-        # Mapeia eventos por ID para facilitar a comparação
-        gmail_events_by_id = {event.source_id: event for event in gmail_events}
-        outlook_events_by_id = {event.source_id: event for event in outlook_events}
-        
-        # Mapeia eventos por fingerprint para detectar duplicatas
-        gmail_fingerprints = {self._get_event_fingerprint(event): event for event in gmail_events}
-        outlook_fingerprints = {self._get_event_fingerprint(event): event for event in outlook_events}
-        
-        # Eventos para criar no Gmail (existem no Outlook mas não no Gmail)
-        create_in_gmail = {}
-        # Eventos para criar no Outlook (existem no Gmail mas não no Outlook)
-        create_in_outlook = {}
-        # Eventos para atualizar no Gmail (existem em ambos mas foram modificados no Outlook)
-        update_in_gmail = {}
-        # Eventos para atualizar no Outlook (existem em ambos mas foram modificados no Gmail)
-        update_in_outlook = {}
-        
-        # Verifica eventos que existem no Outlook mas não no Gmail
-        for outlook_id, outlook_event in outlook_events_by_id.items():
-            outlook_fingerprint = self._get_event_fingerprint(outlook_event)
-            
-            # Se o fingerprint não existe no Gmail, precisamos criar o evento
-            if outlook_fingerprint not in gmail_fingerprints:
-                # Verifica se o evento já tem um ID correspondente no Gmail
-                # (pode ter sido modificado, então o fingerprint mudou)
-                if outlook_event.source_id not in gmail_events_by_id:
-                    create_in_gmail[outlook_id] = outlook_event
-        
-        # Verifica eventos que existem no Gmail mas não no Outlook
-        for gmail_id, gmail_event in gmail_events_by_id.items():
-            gmail_fingerprint = self._get_event_fingerprint(gmail_event)
-            
-            # Se o fingerprint não existe no Outlook, precisamos criar o evento
-            if gmail_fingerprint not in outlook_fingerprints:
-                # Verifica se o evento já tem um ID correspondente no Outlook
-                # (pode ter sido modificado, então o fingerprint mudou)
-                if gmail_event.source_id not in outlook_events_by_id:
-                    create_in_outlook[gmail_id] = gmail_event
-        
-        # Verifica eventos que existem em ambos mas foram modificados
-        for gmail_id, gmail_event in gmail_events_by_id.items():
-            # Se o evento existe no Outlook
-            if gmail_id in outlook_events_by_id:
-                outlook_event = outlook_events_by_id[gmail_id]
-                gmail_fingerprint = self._get_event_fingerprint(gmail_event)
-                outlook_fingerprint = self._get_event_fingerprint(outlook_event)
-                
-                # Se os fingerprints são diferentes, um dos eventos foi modificado
-                if gmail_fingerprint != outlook_fingerprint:
-                    # Verifica qual evento foi atualizado mais recentemente
-                    if gmail_event.updated > outlook_event.updated:
-                        # Gmail é mais recente, atualiza no Outlook
-                        update_in_outlook[gmail_id] = gmail_event
-                    else:
-                        # Outlook é mais recente, atualiza no Gmail
-                        update_in_gmail[outlook_id] = outlook_event
-        
-        return create_in_gmail, create_in_outlook, update_in_gmail, update_in_outlook
+        merger = StreamingMerger(self._get_event_fingerprint, self.merge_window)
+        for decision in merger.merge(gmail_events, outlook_events):
+            # Um evento descartado por falta de detalhes pode ser o par deste; não o duplica
+            if (decision.action == 'create'
+                    and event_sort_key(decision.event) in incomplete_starts[decision.target]):
+                logger.warning(f"Criação adiada por detalhes incompletos no destino: {decision.event.summary}")
+                continue
+            yield decision
+        logger.debug(f"Pico de eventos pendentes na janela de comparação: {merger.peak_pending}")
     
     def _find_deleted_events(self, current_events: List[CalendarEvent], 
                            previous_events: List[CalendarEvent]) -> List[str]:
@@ -141,74 +130,28 @@ class CalendarSynchronizer:
         
         return list(deleted_ids)
     
-    def synchronize(self):
-        """Executa a sincronização entre os calendários do Gmail e Outlook."""
-        logger.info("Iniciando sincronização de calendários")
-        
-        # Define o intervalo de tempo para buscar eventos
-        time_min = self.last_sync_time - datetime.timedelta(days=1)  # Busca eventos desde 1 dia antes da última sincronização
-        time_max = datetime.datetime.now(pytz.UTC) + datetime.timedelta(days=90)  # Até 90 dias no futuro
-        
-        # Obtém eventos de ambos os calendários
-        gmail_events = self.gmail_adapter.get_events(time_min, time_max)
-        outlook_events = self.outlook_adapter.get_events(time_min, time_max)
-        
-        # Compara eventos para determinar quais precisam ser sincronizados
-        create_in_gmail, create_in_outlook, update_in_gmail, update_in_outlook = self._compare_events(
-            gmail_events, outlook_events
-        )
-        
-        # Processa criações no Gmail
-        for event_id, event in create_in_gmail.items():
-            try:
-                # Cria uma cópia do evento para o Gmail
-                gmail_event = event.copy()
-                gmail_event.source = 'gmail'
-                
-                # Cria o evento no Gmail
-                self.gmail_adapter.create_event(gmail_event)
-                logger.info(f"Evento criado no Gmail: {event.summary}")
-            except Exception as e:
-                logger.error(f"Erro ao criar evento no Gmail: {e}")
+    def synchronize(self, tiers: Optional[List[SyncTier]] = None, dry_run: bool = False) -> Optional[SyncPlan]:
+        """
+        Executa a sincronização entre os calendários do Gmail e Outlook.
         
-        # Processa criações no Outlook
-        for event_id, event in create_in_outlook.items():
-            try:
-                # Cria uma cópia do evento para o Outlook
-                outlook_event = event.copy()
-                outlook_event.source = 'outlook'
-                
-                # Cria o evento no Outlook
-                self.outlook_adapter.create_event(outlook_event)
-                logger.info(f"Evento criado no Outlook: {event.summary}")
-            except Exception as e:
-                logger.error(f"Erro ao criar evento no Outlook: {e}")
+        Sincroniza as faixas informadas (todas, por padrão), da mais próxima para a mais distante.
+        Em modo de simulação (`dry_run`), apenas monta e retorna o plano, sem escrever nada;
+        fora dela, as escritas são aplicadas à medida que são planejadas e nada é retornado.
+        """
+        tiers = sorted(tiers if tiers is not None else self.tiers, key=lambda tier: tier.priority)
+        logger.info(f"Iniciando sincronização de calendários: {', '.join(tier.name for tier in tiers)}")
         
-        # Processa atualizações no Gmail
-        for event_id, event in update_in_gmail.items():
-            try:
-                # Cria uma cópia do evento para o Gmail
-                gmail_event = event.copy()
-                gmail_event.source = 'gmail'
-                
-                # Atualiza o evento no Gmail
-                self.gmail_adapter.update_event(gmail_event)
-                logger.info(f"Evento atualizado no Gmail: {event.summary}")
-            except Exception as e:
-                logger.error(f"Erro ao atualizar evento no Gmail: {e}")
+        self.executor.start_cycle()
+        full_plan = SyncPlan() if dry_run else None
+        written_ids = set()
+        synced_tiers = set()
+        for tier in tiers:
+            if tier.name not in synced_tiers:
+                self._sync_tier(tier, written_ids, synced_tiers, full_plan)
         
-        # Processa atualizações no Outlook
-        for event_id, event in update_in_outlook.items():
-            try:
-                # Cria uma cópia do evento para o Outlook
-                outlook_event = event.copy()
-                outlook_event.source = 'outlook'
-                
-                # Atualiza o evento no Outlook
-                self.outlook_adapter.update_event(outlook_event)
-                logger.info(f"Evento atualizado no Outlook: {event.summary}")
-            except Exception as e:
-                logger.error(f"Erro ao atualizar evento no Outlook: {e}")
+        if dry_run:
+            logger.info("Simulação concluída; nenhuma alteração foi feita")
+            return full_plan
         
         # Processa exclusões (eventos que existiam na última sincronização mas não existem mais)
         # Nota: Esta é uma implementação simplificada. Uma implementação mais robusta
@@ -217,19 +160,212 @@ class CalendarSynchronizer:
         # Salva o timestamp da sincronização atual
         self._save_last_sync_time()
         
-        logger.info(f"Sincronização concluída. Próxima sincronização em {self.sync_interval} minutos")
+        logger.info("Sincronização concluída")
+        return None
+    
+    def _sync_tier(self, tier: SyncTier, written_ids: Set[str], synced_tiers: Set[str],
+                   dry_run_plan: Optional[SyncPlan] = None):
+        """
+        Compara os eventos de uma faixa e aplica as escritas à medida que o merge as emite.
+        
+        As decisões são acumuladas em blocos de até `APPLY_CHUNK_SIZE`, de modo que a
+        memória continua limitada pela janela do merge, mesmo em alterações em massa.
+        Em simulação, os blocos planejados são apenas acrescentados a `dry_run_plan`.
+        
+        As leituras também consomem a cota: a faixa não começa (nem continua a listar
+        os eventos) se o orçamento de algum provedor estiver esgotado.
+        """
+        synced_tiers.add(tier.name)
+        if self._defer_if_exhausted(tier):
+            return
+        
+        queue = WriteQueue()
+        for decision in self._stream_tier(tier, written_ids):
+            queue.push(tier, decision)
+            if len(queue) >= APPLY_CHUNK_SIZE:
+                self._flush_queue(tier, queue, written_ids, synced_tiers, dry_run_plan)
+                if self._defer_if_exhausted(tier):
+                    return
+        self._flush_queue(tier, queue, written_ids, synced_tiers, dry_run_plan)
+    
+    def _defer_if_exhausted(self, tier: SyncTier) -> bool:
+        """Adia a faixa para os próximos ciclos se o orçamento de algum provedor estiver esgotado."""
+        exhausted = self.executor.exhausted()
+        if not exhausted:
+            return False
+        logger.warning(f"Orçamento de chamadas esgotado para {', '.join(exhausted)}; faixa {tier.name} adiada")
+        # A faixa aguarda a sua cadência e é planejada novamente quando houver orçamento
+        tier.last_run = datetime.datetime.now(pytz.UTC)
+        self.executor.backlog.add(tier.name)
+        return True
+    
+    def _flush_queue(self, tier: SyncTier, queue: WriteQueue, written_ids: Set[str],
+                     synced_tiers: Set[str], dry_run_plan: Optional[SyncPlan]):
+        """Planeja e executa (ou apenas registra, em simulação) um bloco de escritas."""
+        if not queue:
+            return
+        plan = self.planner.build(queue)
+        if dry_run_plan is not None:
+            # Marca, sem consumir o orçamento, o que seria executado neste ciclo e o que ficaria para depois
+            self.executor.select(plan, dry_run=True)
+        
+        for target, estimate in plan.estimates.items():
+            if estimate.operations:
+                logger.info(
+                    f"Plano da faixa {tier.name} para {target}: {estimate.operations} escritas "
+                    f"({estimate.deferred} adiadas), {estimate.calls} chamadas, "
+                    f"{estimate.http_requests} requisições, ~{estimate.bytes} bytes"
+                )
+        
+        if dry_run_plan is not None:
+            dry_run_plan.operations.extend(plan.operations)
+        else:
+            self._execute_plan(plan, written_ids, synced_tiers)
+    
+    def _stream_tier(self, tier: SyncTier, written_ids: Set[str]) -> Iterator[SyncDecision]:
+        """Compara os eventos de uma faixa, emitindo as decisões de sincronização incrementalmente."""
+        now = datetime.datetime.now(pytz.UTC)
+        time_min, time_max = tier.window(now)
+        tier.last_run = now
+        # Escritas adiadas desta faixa serão recalculadas a partir do estado atual
+        self.executor.backlog.discard(tier.name)
+        logger.info(f"Sincronizando faixa {tier.name} ({time_min.isoformat()} a {time_max.isoformat()})")
+        
+        # Obtém os eventos de ambos os calendários como fluxos ordenados por início.
+        # Cada evento pertence apenas à faixa do seu início. Como as escritas são feitas
+        # com as listagens ainda abertas, um evento pode reaparecer em páginas seguintes
+        # (a paginação do Outlook é por deslocamento): eventos já escritos ou já vistos
+        # nesta passagem são ignorados, para não serem tomados por eventos sem par.
+        seen_ids = set()
+        def in_tier(event: CalendarEvent) -> bool:
+            if not time_min <= event_sort_key(event) < time_max:
+                return False
+            if event.source_id in written_ids or event.source_id in seen_ids:
+                return False
+            seen_ids.add(event.source_id)
+            return True
+        
+        # Cada listagem registra os próprios eventos descartados por falta de detalhes,
+        # de modo que uma faixa que a interrompa não afete o controle desta
+        incomplete_starts = {'gmail': set(), 'outlook': set()}
+        gmail_events = filter(in_tier, self.gmail_adapter.iter_events(
+            time_min, time_max, incomplete_starts['gmail']))
+        outlook_events = filter(in_tier, self.outlook_adapter.iter_events(
+            time_min, time_max, incomplete_starts['outlook']))
+        
+        yield from self._stream_compare(gmail_events, outlook_events, incomplete_starts)
+    
+    def _execute_plan(self, plan: SyncPlan, written_ids: Set[str], synced_tiers: Set[str]):
+        """
+        Executa o plano dentro do orçamento do ciclo, em ordem de prioridade.
+        
+        Escritas no Gmail são enviadas em lotes. Se uma faixa mais próxima vencer
+        durante a execução, ela é sincronizada e executada antes de continuar.
+        """
+        runnable = self.executor.select(plan)
+        gmail_writes = []
+        for operation in runnable.operations:
+            self._run_preempting_tiers(operation.priority, written_ids, synced_tiers)
+            
+            if operation.target == 'gmail':
+                gmail_writes.append(operation)
+                if len(gmail_writes) >= GMAIL_WRITE_BATCH_SIZE:
+                    self._flush_gmail_writes(gmail_writes, written_ids)
+                    gmail_writes = []
+            else:
+                written_event = self._apply_decision(operation.to_decision())
+                if written_event is not None:
+                    written_ids.add(written_event.source_id)
+        
+        if gmail_writes:
+            self._flush_gmail_writes(gmail_writes, written_ids)
+    
+    def _run_preempting_tiers(self, priority: int, written_ids: Set[str], synced_tiers: Set[str]):
+        """
+        Sincroniza as faixas de maior prioridade que venceram durante a execução de um plano.
+        
+        Faixas já sincronizadas nesta chamada de `synchronize` não são repetidas.
+        """
+        now = datetime.datetime.now(pytz.UTC)
+        for tier in self.tiers:
+            if tier.priority >= priority:
+                break
+            if tier.name not in synced_tiers and tier.is_due(now):
+                self._sync_tier(tier, written_ids, synced_tiers)
+    
+    def _flush_gmail_writes(self, operations: List[PlannedOperation], written_ids: Set[str]):
+        """Envia ao Gmail, em um único lote, as escritas acumuladas."""
+        writes = []
+        for operation in operations:
+            # Cria uma cópia do evento para o Gmail
+            gmail_event = operation.event.copy()
+            gmail_event.source = 'gmail'
+            writes.append((operation.action, gmail_event))
+        
+        try:
+            results = self.gmail_adapter.write_events(writes)
+        except Exception as e:
+            logger.error(f"Erro ao enviar lote de escritas para o Gmail: {e}")
+            return
+        
+        for operation, written_event in zip(operations, results):
+            if written_event is None:
+                continue
+            written_ids.add(written_event.source_id)
+            if operation.action == 'create':
+                logger.info(f"Evento criado no Gmail: {operation.summary}")
+            else:
+                logger.info(f"Evento atualizado no Gmail: {operation.summary}")
+    
+    def _apply_decision(self, decision: SyncDecision) -> Optional[CalendarEvent]:
+        """Aplica uma decisão de sincronização, retornando o evento escrito ou None em caso de erro."""
+        event = decision.event
+        adapter = self.gmail_adapter if decision.target == 'gmail' else self.outlook_adapter
+        provider = 'Gmail' if decision.target == 'gmail' else 'Outlook'
+        
+        try:
+            # Cria uma cópia do evento para o calendário de destino
+            target_event = event.copy()
+            target_event.source = decision.target
+            
+            if decision.action == 'create':
+                written_event = adapter.create_event(target_event)
+                logger.info(f"Evento criado no {provider}: {event.summary}")
+            else:
+                written_event = adapter.update_event(target_event)
+                logger.info(f"Evento atualizado no {provider}: {event.summary}")
+            return written_event
+        except Exception as e:
+            verb = 'criar' if decision.action == 'create' else 'atualizar'
+            logger.error(f"Erro ao {verb} evento no {provider}: {e}")
+            return None
     
     def run_continuous(self):
-        """Executa a sincronização continuamente com o intervalo configurado."""
-        logger.info(f"Iniciando sincronização contínua com intervalo de {self.sync_interval} minutos")
+        """Executa a sincronização continuamente, respeitando a cadência de cada faixa."""
+        logger.info("Iniciando sincronização contínua: " + ", ".join(
+            f"{tier.name} a cada {int(tier.interval.total_seconds() // 60)} minutos" for tier in self.tiers))
+        
+        # Renova os tokens em segundo plano, antes que expirem no meio de uma passagem
+        credential_manager.start()
         
         try:
             while True:
-                self.synchronize()
-                # Aguarda o intervalo configurado antes da próxima sincronização
-                time.sleep(self.sync_interval * 60)
+                now = datetime.datetime.now(pytz.UTC)
+                due_tiers = [tier for tier in self.tiers if tier.is_due(now)]
+                if due_tiers:
+                    # Faixas com escritas adiadas por cota são planejadas novamente junto
+                    due_tiers += [tier for tier in self.tiers
+                                  if tier.name in self.executor.backlog and tier not in due_tiers]
+                    self.synchronize(due_tiers)
+                
+                # Aguarda até a próxima faixa vencer
+                now = datetime.datetime.now(pytz.UTC)
+                next_run = min(tier.next_run() or now for tier in self.tiers)
+                time.sleep(max((next_run - now).total_seconds(), 1))
         except KeyboardInterrupt:
             logger.info("Sincronização interrompida pelo usuário")
         except Exception as e:
             logger.error(f"Erro durante a sincronização contínua: {e}")
-            raise
\ No newline at end of file
+            raise
+        finally:
+            credential_manager.stop()
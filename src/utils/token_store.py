@@ -0,0 +1,81 @@
+import os # os é utilizado para manipular arquivos e substituí-los de forma atômica.
+import tempfile # tempfile é utilizado para criar o arquivo temporário da escrita atômica.
+import threading # threading é utilizado para tornar o bloqueio reentrante dentro do processo.
+
+try:
+    import fcntl # fcntl fornece bloqueio de arquivos em sistemas Unix.
+except ImportError: # pragma: no cover - Windows
+    fcntl = None
+    import msvcrt # msvcrt fornece bloqueio de arquivos no Windows.
+
+
+class FileLock:
+    """
+    Bloqueio exclusivo entre processos baseado em um arquivo `.lock`.
+
+    O bloqueio é reentrante dentro do mesmo processo, de modo que uma rotina
+    que já o possui pode chamar outra que também o solicita.
+    """
+
+    def __init__(self, path: str):
+        self.lock_path = f"{path}.lock"
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._handle = None
+
+    def acquire(self):
+        self._thread_lock.acquire()
+        if self._depth == 0:
+            directory = os.path.dirname(os.path.abspath(self.lock_path))
+            os.makedirs(directory, exist_ok=True)
+            self._handle = open(self.lock_path, 'a+')
+            if fcntl:
+                fcntl.flock(self._handle.fileno(), fcntl.LOCK_EX)
+            else:
+                self._handle.seek(0)
+                msvcrt.locking(self._handle.fileno(), msvcrt.LK_LOCK, 1)
+        self._depth += 1
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0:
+            if fcntl:
+                fcntl.flock(self._handle.fileno(), fcntl.LOCK_UN)
+            else:
+                self._handle.seek(0)
+                msvcrt.locking(self._handle.fileno(), msvcrt.LK_UNLCK, 1)
+            self._handle.close()
+            self._handle = None
+        self._thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+
+def read_text(path: str):
+    """Lê o conteúdo de um arquivo, retornando None se ele não existir."""
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        return f.read()
+
+
+def atomic_write(path: str, content: str):
+    """Grava o conteúdo em um arquivo temporário e o substitui atomicamente no destino."""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-', suffix=os.path.basename(path))
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise